@@ -0,0 +1,2 @@
+"""Timing scripts for the file conversion and analysis code
+"""
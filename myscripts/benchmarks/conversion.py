@@ -0,0 +1,125 @@
+"""Throughput of each stage of the UM conversion on synthetic forecasts
+
+Times :func:`myscripts.files.redo_cubes`, :func:`myscripts.files.derived`,
+remapping the PV tracers (:meth:`StashMap.remap_cubelist`) and saving to
+NetCDF on one lead time of the synthetic UM-like cubes from
+:mod:`myscripts.benchmarks.synthetic`. Each stage runs in a fresh process so
+the peak memory (maximum resident set size) of one stage is not hidden by
+another.
+"""
+
+import os
+import resource
+import tempfile
+import time
+import iris
+from myscripts import files, parallel
+from myscripts.benchmarks import synthetic
+from myscripts.files import stash_maps
+
+# 'laptop' or 'nae' (see myscripts.benchmarks.synthetic.sizes)
+size = 'laptop'
+
+# Number of times to run each stage. The fastest time is reported
+repeats = 3
+
+
+def main():
+    stages = ['remap_cubelist', 'redo_cubes', 'derived', 'save']
+
+    # One job per process so the peak memory is measured for each stage
+    jobs = [(stage, run_stage, (stage, size, repeats), {})
+            for stage in stages]
+    results, failures = parallel.run(jobs, nproc=1, maxtasksperchild=1)
+
+    print('Stage'.ljust(16) + 'Time (s)'.rjust(12) + 'Fields/s'.rjust(12) +
+          'MB/s'.rjust(12) + 'Input RSS (MB)'.rjust(16) +
+          'Peak RSS (MB)'.rjust(16))
+    for stage in stages:
+        if stage in results:
+            seconds, nfields, nbytes, rss_input, rss_peak = results[stage]
+            print(stage.ljust(16) + '{:12.3f}'.format(seconds) +
+                  '{:12.1f}'.format(nfields / seconds) +
+                  '{:12.1f}'.format(nbytes / seconds / 1e6) +
+                  '{:16.1f}'.format(rss_input / 1e6) +
+                  '{:16.1f}'.format(rss_peak / 1e6))
+
+    return
+
+
+def run_stage(stage, size, repeats):
+    """Time one stage of the conversion
+
+    Args:
+        stage (str): 'remap_cubelist', 'redo_cubes', 'derived' or 'save'
+
+        size (str): Size of the synthetic cubes
+
+        repeats (int): Number of times to run the stage
+
+    Returns:
+        tuple: Fastest time (s), number of input fields, input size (bytes),
+            maximum RSS before running the stage and the maximum RSS after
+            (bytes)
+    """
+    function = globals()['_' + stage]
+
+    seconds = []
+    for n in range(repeats):
+        # Each stage can modify its inputs so create them every time
+        cubes, args = _inputs(stage, size)
+        nfields = sum(cube.shape[0] if cube.ndim == 3 else 1
+                      for cube in cubes)
+        nbytes = sum(cube.data.nbytes for cube in cubes)
+        rss_input = _max_rss()
+
+        start = time.time()
+        function(cubes, *args)
+        seconds.append(time.time() - start)
+
+    return min(seconds), nfields, nbytes, rss_input, _max_rss()
+
+
+def _inputs(stage, size):
+    if stage == 'remap_cubelist':
+        return synthetic.tracer_cubes(size), ()
+    elif stage == 'redo_cubes':
+        return synthetic.prognostic_cubes(size), (synthetic.basis_cube(size),)
+    elif stage == 'derived':
+        # derived is run on the raw cubes, before redo_cubes, as in
+        # myscripts.files.forecasts
+        return synthetic.prognostic_cubes(size), ()
+    elif stage == 'save':
+        return synthetic.prognostic_cubes(size), ()
+    else:
+        raise ValueError('Unknown stage ' + str(stage))
+
+
+def _remap_cubelist(cubes):
+    stash_maps.pv_tracers.remap_cubelist(cubes)
+
+
+def _redo_cubes(cubes, basis_cube):
+    files.redo_cubes(cubes, basis_cube)
+
+
+def _derived(cubes):
+    files.derived(cubes)
+
+
+def _save(cubes):
+    filename = tempfile.mktemp(suffix='.nc')
+    try:
+        iris.save(cubes, filename)
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def _max_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Synthetic UM-like cubes for benchmarking the conversion code
+
+The cubes mimic raw UM output: a rotated-pole grid with staggered winds,
+hybrid-height levels with a derived altitude coordinate and STASH attributes.
+"""
+
+import datetime
+import numpy as np
+from cf_units import Unit
+from iris.aux_factory import HybridHeightFactory
+from iris.coord_systems import GeogCS, RotatedGeogCS
+from iris.coords import AuxCoord, DimCoord
+from iris.cube import Cube, CubeList
+from iris.fileformats.pp import STASH
+from myscripts.files import stash_maps
+
+# Number of levels, rows and columns
+sizes = {
+    'laptop': (20, 60, 80),
+    'nae': (70, 360, 600),
+}
+
+# NAE rotated pole and grid spacing
+cs = RotatedGeogCS(37.5, 177.5, ellipsoid=GeogCS(6371229.0))
+spacing = 0.11
+z_top = 40000.0
+
+time_units = Unit('hours since 2011-11-28 00:00:00', calendar='gregorian')
+start_time = datetime.datetime(2011, 11, 28)
+
+# Name, units, STASH and grid (theta, rho, u or v points) of the prognostics
+prognostics = [
+    ('x_wind', 'm s-1', STASH(1, 0, 2), 'u'),
+    ('y_wind', 'm s-1', STASH(1, 0, 3), 'v'),
+    ('upward_air_velocity', 'm s-1', STASH(1, 0, 150), 'theta'),
+    ('air_potential_temperature', 'K', STASH(1, 0, 4), 'theta'),
+    ('air_density', 'kg m-3', STASH(1, 0, 253), 'rho'),
+    ('specific_humidity', 'kg kg-1', STASH(1, 0, 10), 'theta'),
+]
+
+
+def prognostic_cubes(size='laptop', lead_time=1):
+    """Cubes needed by files.derived and files.redo_cubes at one lead time
+    """
+    cubes = CubeList()
+    for name, units, stash, points in prognostics:
+        cube = make_cube(size, points, lead_time)
+        cube.rename(name)
+        cube.units = units
+        cube.attributes['STASH'] = stash
+        cube.data = _values(name, cube)
+        cubes.append(cube)
+
+    return cubes
+
+
+def tracer_cubes(size='laptop', lead_time=1):
+    """PV tracers with only STASH codes to identify them, as remapped by
+    myscripts.files.stash_maps.pv_tracers
+    """
+    cubes = CubeList()
+    for stash in sorted(stash_maps.pv_tracers, key=str):
+        cube = make_cube(size, 'theta', lead_time)
+        cube.attributes['STASH'] = stash
+        cube.units = stash_maps.pv_tracers[stash].units
+        cube.data = np.random.normal(scale=0.1, size=cube.shape)
+        cubes.append(cube)
+
+    return cubes
+
+
+def basis_cube(size='laptop'):
+    """A target grid for files.redo_cubes, trimmed at the edges of the
+    synthetic domain like the basis cube used for the case studies
+    """
+    cube = make_cube(size, 'theta', 0)[:-1, 5:-5, 5:-5]
+    cube.remove_coord('model_level_number')
+    cube.remove_aux_factory(cube.aux_factory('altitude'))
+    for coord in ['sigma', 'surface_altitude', 'forecast_period',
+                  'forecast_reference_time']:
+        cube.remove_coord(coord)
+    cube.rename('air_temperature')
+
+    # Put the target altitude on the level_height dimension
+    z = cube.coord('level_height')
+    cube.remove_coord(z)
+    cube.add_dim_coord(DimCoord.from_coord(z), 0)
+
+    return cube
+
+
+def make_cube(size, points, lead_time):
+    """An empty cube on one of the staggered UM grids
+
+    Args:
+        size (str): One of the keys of `sizes`
+
+        points (str): 'theta', 'rho', 'u' or 'v'
+
+        lead_time (int): Hours since the start time
+
+    Returns:
+        iris.cube.Cube:
+    """
+    nz, ny, nx = sizes[size]
+
+    # Rho levels are half way between theta levels
+    eta = np.linspace(0, 1, nz + 1)[1:]
+    if points in ('rho', 'u', 'v'):
+        eta = eta - 0.5 / nz
+    level_height = eta * z_top
+    sigma = np.maximum(1 - eta / 0.3, 0) ** 2
+
+    lon = 360 - (nx / 2) * spacing + np.arange(nx) * spacing
+    lat = -(ny / 2) * spacing + np.arange(ny) * spacing
+    if points == 'u':
+        lon = lon + spacing / 2
+    elif points == 'v':
+        lat = lat + spacing / 2
+
+    # Gaussian hill for the orography
+    x, y = np.meshgrid(lon - lon.mean(), lat - lat.mean())
+    orography = 2000 * np.exp(-(x ** 2 + y ** 2) / (10 * spacing) ** 2)
+
+    fp = AuxCoord(lead_time, standard_name='forecast_period', units='hours')
+    frt = AuxCoord(0, standard_name='forecast_reference_time',
+                   units=time_units)
+    time = AuxCoord(lead_time, standard_name='time', units=time_units)
+
+    cube = Cube(
+        np.zeros([nz, ny, nx]),
+        dim_coords_and_dims=[
+            (DimCoord(np.arange(1, nz + 1),
+                      standard_name='model_level_number'), 0),
+            (DimCoord(lat, standard_name='grid_latitude', units='degrees',
+                      coord_system=cs), 1),
+            (DimCoord(lon, standard_name='grid_longitude', units='degrees',
+                      coord_system=cs), 2)],
+        aux_coords_and_dims=[
+            (AuxCoord(level_height, long_name='level_height', units='m',
+                      attributes={'positive': 'up'}), 0),
+            (AuxCoord(sigma, long_name='sigma'), 0),
+            (AuxCoord(orography, standard_name='surface_altitude',
+                      units='m'), (1, 2)),
+            (fp, None), (frt, None), (time, None)])
+
+    cube.add_aux_factory(HybridHeightFactory(
+        delta=cube.coord('level_height'), sigma=cube.coord('sigma'),
+        orography=cube.coord('surface_altitude')))
+
+    return cube
+
+
+def _values(name, cube):
+    """Smooth fields with a bit of noise in a realistic range
+    """
+    z = cube.coord('altitude').points
+    lat = np.deg2rad(cube.coord('grid_latitude').points)[:, np.newaxis]
+    noise = np.random.normal(scale=0.01, size=cube.shape)
+
+    if name == 'air_potential_temperature':
+        return 280 + 4e-3 * z + 5 * np.sin(10 * lat) + noise
+    elif name == 'air_density':
+        return 1.2 * np.exp(-z / 8000) * (1 + noise)
+    elif name == 'specific_humidity':
+        return 1e-2 * np.exp(-z / 2000) * (1 + noise)
+    elif name == 'upward_air_velocity':
+        return 0.1 * noise
+    else:
+        return 10 + 20 * np.exp(-((z - 10000) / 3000) ** 2) + noise
@@ -0,0 +1,104 @@
+"""Compare read times of converted forecast files saved with each write profile
+
+Saves a set of synthetic lead-time files with each profile from
+:mod:`myscripts.files.profiles` and times the common ways of reading them:
+whole 3d fields at one lead time, one level across all lead times and one
+column across all lead times. Times are shown with the speed-up relative to
+the default iris storage in brackets.
+"""
+
+import os
+import tempfile
+import time
+import numpy as np
+import netCDF4
+from iris.coords import DimCoord
+from iris.cube import Cube, CubeList
+from myscripts import files
+
+# Size of the synthetic forecast
+nt, nz, ny, nx = 12, 70, 360, 600
+
+profiles = [None, 'map', 'timeseries', 'column']
+
+
+def main():
+    path = tempfile.mkdtemp()
+
+    reads = [('3d field', read_field), ('Level', read_level),
+             ('Column', read_column)]
+
+    print('Profile'.ljust(12) + 'Size (MB)'.rjust(12) +
+          ''.join((name + ' (s)').rjust(22) for name, read in reads))
+    baseline = None
+    for profile in profiles:
+        filenames = write_files(path, profile)
+        size = sum(os.path.getsize(filename) for filename in filenames)
+
+        times = [time_reads(filenames, read) for name, read in reads]
+        if baseline is None:
+            baseline = times
+
+        print(str(profile).ljust(12) + '{:12.1f}'.format(size / 1e6) +
+              ''.join('{:14.3f} ({:5.1f}x)'.format(t, t0 / t)
+                      for t, t0 in zip(times, baseline)))
+
+        for filename in filenames:
+            os.remove(filename)
+
+    os.rmdir(path)
+
+    return
+
+
+def write_files(path, profile):
+    filenames = []
+    for n in range(nt):
+        filename = os.path.join(path, '{}_{:03d}.nc'.format(profile, n))
+        files.save(CubeList([synthetic_cube(n)]), filename, profile=profile)
+        filenames.append(filename)
+
+    return filenames
+
+
+def synthetic_cube(n):
+    # Smooth field plus noise so compression is realistic
+    z, y, x = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx),
+                          indexing='ij')
+    data = (300 + z + np.sin(2 * np.pi * (x + n) / nx) * np.cos(
+        2 * np.pi * y / ny) + np.random.normal(scale=0.1, size=z.shape))
+
+    return Cube(
+        data, long_name='synthetic', units='K',
+        dim_coords_and_dims=[
+            (DimCoord(np.arange(nz) * 250.0, long_name='level_height',
+                      units='m'), 0),
+            (DimCoord(np.linspace(-10, 10, ny), standard_name='grid_latitude',
+                      units='degrees'), 1),
+            (DimCoord(np.linspace(330, 370, nx),
+                      standard_name='grid_longitude', units='degrees'), 2)])
+
+
+def time_reads(filenames, read):
+    start = time.time()
+    for filename in filenames:
+        with netCDF4.Dataset(filename) as dataset:
+            read(dataset.variables['synthetic'])
+
+    return time.time() - start
+
+
+def read_field(variable):
+    return variable[:]
+
+
+def read_level(variable):
+    return variable[nz // 2]
+
+
+def read_column(variable):
+    return variable[:, ny // 2, nx // 2]
+
+
+if __name__ == '__main__':
+    main()
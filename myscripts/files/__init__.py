@@ -1,19 +1,132 @@
 import iris
-from iris.analysis import Linear
 from iris.cube import CubeList
+from iris.fileformats import netcdf
 from iris.util import squeeze
-from irise import calculus, convert, interpolate, grid, variable
+from irise import convert, grid
 from myscripts.files import stash_maps
-
-
-def load_cubes(filename, names):
-    cubes = iris.load(filename)
+from myscripts.files.derivatives import Derivatives
+from myscripts.files.pp_index import PPIndex
+from myscripts.files.profiles import profiles
+from myscripts.files.regrid import RegridPlan, plan_key
+
+
+def load_cubes(filename, names, fields=None, stash_codes=()):
+    """Load the named variables from a file
+
+    Only the fields needed are loaded from the file and their data is left
+    unloaded until it is used.
+
+    Args:
+        filename (str):
+        names (list): Names of variables to return. Calculated from the
+            loaded fields with :func:`irise.convert.calc`
+        fields (list, optional): Names of the fields to load from the file.
+            Default is `names`
+        stash_codes (list, optional): STASH codes of extra fields to load
+
+    Returns:
+        iris.cube.CubeList:
+    """
+    if fields is None:
+        fields = names
+    cubes = iris.load(filename, field_constraints(fields, stash_codes))
     cubes = convert.calc(names, cubes)
 
     return cubes
 
 
-def redo_cubes(cubes, basis_cube, stash_maps=[], slices=None, time=None):
+def field_constraints(names=(), stash_codes=()):
+    """Constraints to load fields by name or STASH code
+
+    iris applies STASH constraints to the PP/fieldsfile field headers, so
+    fields that don't match are never turned into cubes.
+
+    Args:
+        names (list): Field names
+        stash_codes (list): STASH codes as iris.fileformats.pp.STASH or
+            strings (e.g. 'm01s00i004')
+
+    Returns:
+        list: Constraints for :func:`iris.load` that match any of the fields
+    """
+    constraints = [iris.Constraint(name) for name in names]
+    constraints += [iris.AttributeConstraint(STASH=stash)
+                    for stash in stash_codes]
+
+    return constraints
+
+
+def load_fields(filename, stash_codes, time=None, level=None):
+    """Load individual fields from a PP file or fieldsfile
+
+    Uses the header index of the file (see
+    :class:`myscripts.files.pp_index.PPIndex`) to read only the selected
+    fields
+
+    Args:
+        filename (str):
+        stash_codes (list): STASH codes as iris.fileformats.pp.STASH or
+            strings (e.g. 'm01s00i004')
+        time (datetime.datetime, optional): Only load this validity time
+        level (int, optional): Only load this model level number
+
+    Returns:
+        iris.cube.CubeList:
+    """
+    index = PPIndex.open(filename)
+
+    return index.load(index.find(stash_codes, time=time, level=level))
+
+
+def save(cubes, filename, profile=None):
+    """Save cubes to NetCDF with the storage settings of a write profile
+
+    Args:
+        cubes (iris.cube.CubeList):
+        filename (str):
+        profile (str or myscripts.files.profiles.WriteProfile, optional):
+            One of 'map', 'timeseries' or 'column' (see
+            :mod:`myscripts.files.profiles`). Default is None which uses the
+            default iris storage
+    """
+    if profile is None:
+        iris.save(cubes, filename)
+        return
+
+    if isinstance(profile, str):
+        profile = profiles[profile]
+
+    with netcdf.Saver(filename, 'NETCDF4') as saver:
+        for cube in cubes:
+            cube, kwargs = profile.prepare(cube)
+            saver.write(cube, **kwargs)
+        saver.update_global_attributes(
+            Conventions=netcdf.CF_CONVENTIONS_VERSION)
+
+    return
+
+
+def redo_cubes(cubes, basis_cube, stash_maps=[], slices=None, time=None,
+               plans=None):
+    """Put the cubes in a standard format on the grid of the basis cube
+
+    Args:
+        cubes (iris.cube.CubeList):
+        basis_cube (iris.cube.Cube): A 3d cube on the target grid
+        stash_maps (list): StashMap objects used to rename custom variables
+        slices: Not used
+        time (str, optional): Units to convert the time coordinate to
+        plans (dict, optional): Regridding plans from previous calls with the
+            same basis cube, keyed by :func:`myscripts.files.regrid.plan_key`.
+            New plans are added to the dictionary so they can be reused by
+            later calls
+
+    Returns:
+        iris.cube.CubeList:
+    """
+    if plans is None:
+        plans = {}
+
     # Coordinates to copy to analyses
     z = grid.extract_dim_coord(basis_cube, 'z')
 
@@ -42,12 +155,11 @@ def redo_cubes(cubes, basis_cube, stash_maps=[], slices=None, time=None):
             iris.util.promote_aux_coord_to_dim_coord(newcube, z.name())
 
             # Remap the cubes to theta points
-            newcube = interpolate.remap_3d(newcube, basis_cube, z.name())
+            newcube = regrid(newcube, basis_cube, plans, z.name())
 
         else:
             # Regrid in the horizontal
-            newcube = newcube.regrid(basis_cube, Linear())
-
+            newcube = regrid(newcube, basis_cube, plans)
 
         # Convert the main time coordinate
         if time is not None:
@@ -58,7 +170,26 @@ def redo_cubes(cubes, basis_cube, stash_maps=[], slices=None, time=None):
     return newcubelist
 
 
-def derived(cubes):
+def regrid(cube, basis_cube, plans, z_name=None):
+    # Only calculate the interpolation weights once for each source grid
+    key = plan_key(cube, z_name)
+    if key not in plans:
+        plans[key] = RegridPlan(cube, basis_cube, z_name)
+
+    return plans[key].regrid(cube)
+
+
+def derived(cubes, dtype=None):
+    """Add vorticity, divergence and PV calculated from the wind and theta
+
+    Args:
+        cubes (iris.cube.CubeList): Must contain x_wind, y_wind,
+            upward_air_velocity, air_potential_temperature and air_density.
+            The derived cubes are appended to this cubelist
+        dtype (optional): Data type to calculate and store the derived
+            diagnostics in (e.g. numpy.float32). Default is the data type of
+            theta
+    """
     # Extract variables
     u = cubes.extract('x_wind')[0]
     v = cubes.extract('y_wind')[0]
@@ -66,18 +197,8 @@ def derived(cubes):
     theta = convert.calc('air_potential_temperature', cubes)
     rho = convert.calc('air_density', cubes)
 
-    # Vorticity
-    xi_i, xi_j, xi_k = variable.vorticity(u, v, w)
-
-    # Divergence
-    div = calculus.div(u, v, w)
-    div.rename('divergence')
-
-    # PV using different calculation
-    pv = variable.calc_pv(u, v, w, theta, rho)
-    pv.rename('derived_pv')
-
-    for cube in [xi_i, xi_j, xi_k, div, pv]:
+    # Vorticity, divergence and PV from the same set of derivatives
+    for cube in Derivatives(u, v, w, theta, rho, dtype=dtype).cubes():
         cubes.append(cube)
 
     return
@@ -3,23 +3,49 @@ Start by running the script conv2nc.tcl on the raw analyses from the xcm
 """
 
 import datetime
+import hashlib
+import os
+import numpy as np
 import iris
+from iris.aux_factory import HybridHeightFactory
+from iris.coords import AuxCoord
 from iris.cube import CubeList
 from iris.util import squeeze
 from irise import constants, grid
 from myscripts import datadir
 from myscripts import files
+from myscripts.files.manifest import Manifest
+
+# NetCDF storage for the output files (None, 'map', 'timeseries' or 'column').
+# See myscripts.files.profiles
+write_profile = None
 
 # Define which area of grid to subset
 slices = slice(0, 50), slice(15, -15), slice(15, -15)
 
 # Load basis cube
-basis_cube = iris.load_cube(datadir + 'xjjhl/basis_cube.nc',
-                            'air_temperature')
+basis_file = datadir + 'xjjhl/basis_cube.nc'
+basis_cube = iris.load_cube(basis_file, 'air_temperature')
+
 lat = grid.extract_dim_coord(basis_cube, 'y')
 lon = grid.extract_dim_coord(basis_cube, 'x')
 
-raw_cubes = iris.load(datadir + 'xjjhl/xjjhl.astart')
+# Regridding plans to the basis cube grid, reused for every file
+plans = {}
+
+raw_file = datadir + 'xjjhl/xjjhl.astart'
+raw_cubes = iris.load(raw_file)
+
+# Sigma and orography coordinates of each variable in the raw start file, found
+# once by name rather than searching raw_cubes for every cube
+raw_coords = {}
+for raw_cube in raw_cubes:
+    if raw_cube.coords('sigma') and raw_cube.name() not in raw_coords:
+        raw_coords[raw_cube.name()] = (raw_cube.coord('sigma'),
+                                       raw_cube.coord('surface_altitude'))
+
+# Altitude coordinates already calculated for each vertical grid
+hybrid_heights = {}
 
 # Define how to rename variables
 name_pairs = [
@@ -44,7 +70,19 @@ units = [
 
 
 def main(file_pairs, time):
+    # Only convert analyses that are missing or have changed inputs since the
+    # last conversion
+    manifest = Manifest(os.path.join(
+        os.path.dirname(file_pairs[0][1]), 'manifest.json'))
+    parameters = dict(slices=slices, time=time, name_pairs=name_pairs,
+                      units=units, write_profile=write_profile)
+
     for infile, outfile in file_pairs:
+        entry = manifest.entry([infile, raw_file, basis_file], parameters)
+        if manifest.is_current(outfile, entry):
+            print('Skipping {}'.format(outfile))
+            continue
+
         print(infile, outfile)
         cubes = iris.load(infile)
 
@@ -58,12 +96,10 @@ def main(file_pairs, time):
         # Add auxilliary coordinates
         for cube in cubes:
             if cube.name() == 'air_density':
-                raw_cube = raw_cubes.extract(
-                    'dimensionless_exner_function')[0][:70]
+                sigma, z_0 = raw_coords['dimensionless_exner_function']
+                sigma = sigma[:70]
             else:
-                raw_cube = raw_cubes.extract(cube.name())[0]
-            z_0 = raw_cube.coord('surface_altitude')
-            sigma = raw_cube.coord('sigma')
+                sigma, z_0 = raw_coords[cube.name()]
             add_hybrid_height(cube, sigma, z_0)
 
         # Remove the bottom level from w
@@ -74,7 +110,8 @@ def main(file_pairs, time):
 
         # Convert density to true density
         rho = cubes.extract('air_density')[0]
-        z_rho = rho.coord('altitude')
+        z_rho = hybrid_height(rho.coord('level_height'), rho.coord('sigma'),
+                              rho.coord('surface_altitude'))
         r = z_rho.points + constants.r.data
         rho.data = rho.data / r ** 2
 
@@ -83,9 +120,10 @@ def main(file_pairs, time):
 
         # Put the cubes in standard format on grid
         newcubes = files.redo_cubes(
-            cubes, basis_cube, slices=slices, time=time)
+            cubes, basis_cube, slices=slices, time=time, plans=plans)
 
-        iris.save(newcubes, outfile)
+        files.save(newcubes, outfile, profile=write_profile)
+        manifest.record(outfile, entry)
 
 
 def correct_analyses(cubes):
@@ -130,7 +168,38 @@ def add_hybrid_height(cube, sigma, z_0):
     cube.add_aux_coord(sigma, [0])
     cube.add_aux_coord(z_0, [1, 2])
 
-    grid.add_hybrid_height(cube)
+    # Keep the altitude as a derived coordinate so it is saved with its
+    # formula terms
+    cube.add_aux_factory(HybridHeightFactory(
+        delta=cube.coord('level_height'), sigma=cube.coord('sigma'),
+        orography=cube.coord('surface_altitude')))
+
+
+def hybrid_height(level_height, sigma, z_0):
+    """The 3d altitude coordinate for a hybrid-height vertical grid
+
+    :math:`z = a + b z_0`. The result is cached so each vertical grid is only
+    calculated once. Used where the altitude values are needed directly
+    rather than through the HybridHeightFactory of a cube.
+
+    Args:
+        level_height (iris.coords.Coord): a
+        sigma (iris.coords.Coord): b
+        z_0 (iris.coords.Coord): Surface altitude
+
+    Returns:
+        iris.coords.AuxCoord: A copy of the cached coordinate
+    """
+    key = tuple(hashlib.md5(coord.points.tobytes()).hexdigest()
+                for coord in (level_height, sigma, z_0))
+    if key not in hybrid_heights:
+        z = (level_height.points[:, np.newaxis, np.newaxis] +
+             sigma.points[:, np.newaxis, np.newaxis] * z_0.points)
+        hybrid_heights[key] = AuxCoord(
+            z, standard_name='altitude', units=level_height.units,
+            attributes={'positive': 'up'})
+
+    return hybrid_heights[key].copy()
 
 
 def generate_file_pairs(t_0, dt, nt, path):
@@ -0,0 +1,153 @@
+"""Keep expensive diagnostics calculated from forecast files on disk
+
+Each diagnostic is saved to its own NetCDF file in the cache directory, named
+by a hash of the case, lead time, diagnostic name, levels and the size and
+modification time of the files it was calculated from. Changing any of the
+source files changes the key, so stale results are never returned. When the
+cache grows beyond its size limit the least recently used files are removed.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import iris
+from irise import convert
+from myscripts import datadir
+from myscripts.files.manifest import _serialise
+from myscripts.models.um.forecast import forecast_files
+
+
+class DiagnosticCache(object):
+    """A directory of cached diagnostics
+
+    Args:
+        path (str): Directory to keep the cached files in. Default is
+            datadir + 'cache/'
+
+        max_bytes (int): Size limit of the cache directory. Default is 10 GB
+    """
+
+    def __init__(self, path=datadir + 'cache/', max_bytes=10 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, name, infiles, levels=None, case=None, lead_time=None):
+        """A unique filename for the diagnostic calculated from the given
+        source files
+        """
+        sources = []
+        for filename in sorted(infiles):
+            stat = os.stat(filename)
+            sources.append([filename, stat.st_size, stat.st_mtime])
+
+        description = json.dumps(_serialise(
+            {'name': name, 'levels': levels, 'case': case,
+             'lead_time': lead_time, 'sources': sources}), sort_keys=True)
+
+        return os.path.join(
+            self.path, hashlib.md5(description.encode()).hexdigest() + '.nc')
+
+    def calc(self, name, cubes, infiles, levels=None, case=None,
+             lead_time=None):
+        """Load a diagnostic from the cache or calculate and cache it
+
+        Args:
+            name (str): Diagnostic to calculate with
+                :func:`irise.convert.calc`
+
+            cubes (iris.cube.CubeList): Fields loaded from infiles
+
+            infiles (list): Files the cubes were loaded from
+
+            levels (tuple, optional): Passed to :func:`irise.convert.calc`
+
+            case (str, optional): Name of the case study
+
+            lead_time (datetime.timedelta, optional):
+
+        Returns:
+            iris.cube.Cube or iris.cube.CubeList: As returned by
+                :func:`irise.convert.calc` (a CubeList when levels are given)
+        """
+        filename = self.key(name, infiles, levels, case, lead_time)
+        if os.path.exists(filename):
+            # Mark as recently used
+            os.utime(filename, None)
+            if levels is None:
+                return iris.load_cube(filename)
+            else:
+                return iris.load(filename)
+
+        cube = convert.calc(name, cubes, levels=levels)
+
+        # Save to a temporary file in the cache directory first so an
+        # interrupted save (or another process reading the cache) never sees
+        # an incomplete file
+        fd, tmpfile = tempfile.mkstemp(suffix='.nc.tmp', dir=self.path)
+        os.close(fd)
+        try:
+            iris.save(cube, tmpfile, saver='nc')
+            os.replace(tmpfile, filename)
+        finally:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+        self.evict()
+
+        return cube
+
+    def evict(self):
+        """Remove the least recently used files until the cache is within
+        its size limit
+        """
+        filenames = glob.glob(os.path.join(self.path, '*.nc'))
+        stats = sorted((os.stat(filename).st_mtime, filename)
+                       for filename in filenames)
+        total = sum(os.path.getsize(filename) for filename in filenames)
+
+        for mtime, filename in stats:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(filename)
+            os.remove(filename)
+
+        return
+
+
+def calc(forecast, name, levels=None, case=None, cache=None):
+    """Calculate a diagnostic at the current time of a forecast using the
+    cache
+
+    Args:
+        forecast (irise.forecast.Forecast): Forecast set to the lead time to
+            calculate the diagnostic at (e.g. by iterating over it)
+
+        name (str):
+
+        levels (tuple, optional):
+
+        case (str, optional): Name of the case study
+
+        cache (DiagnosticCache, optional): Default is a cache in the default
+            directory
+
+    Returns:
+        iris.cube.Cube or iris.cube.CubeList: See
+            :meth:`DiagnosticCache.calc`
+    """
+    if cache is None:
+        cache = DiagnosticCache()
+
+    time = forecast.current_time
+    infiles = forecast_files(forecast)[time]
+    if isinstance(infiles, str):
+        infiles = [infiles]
+    infiles = [filename for pattern in infiles
+               for filename in sorted(glob.glob(pattern))]
+
+    return cache.calc(name, forecast.cubelist, infiles, levels=levels,
+                      case=case, lead_time=time - forecast.start_time)
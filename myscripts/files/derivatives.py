@@ -0,0 +1,196 @@
+"""Vorticity, divergence and PV from one set of derivatives of u, v, w and theta
+
+Each derivative is only calculated once and shared between the diagnostics
+that need it. Horizontal derivatives are taken at constant altitude on the
+(rotated) spherical grid, using the chain rule to correct for the
+terrain-following model levels
+
+:math:`\\frac{\\partial f}{\\partial x}\\bigg|_z =
+\\frac{1}{r \\cos\\phi}\\left(\\frac{\\partial f}{\\partial \\lambda}\\bigg|_k -
+\\frac{\\partial z}{\\partial \\lambda}\\bigg|_k
+\\frac{\\partial f}{\\partial z}\\right)`
+"""
+
+import numpy as np
+from iris.analysis.cartography import rotate_pole
+from iris.coord_systems import RotatedGeogCS
+from iris.cube import CubeList
+from irise import constants, grid
+from myscripts.files.regrid import RegridPlan, plan_key
+
+
+class Derivatives(object):
+    """Derived diagnostics of the wind and potential temperature
+
+    All fields are put on the grid of theta before calculating the
+    derivatives.
+
+    Args:
+        u, v, w (iris.cube.Cube): Wind components on model levels. Each must
+            have a level_height coordinate
+
+        theta (iris.cube.Cube): Potential temperature with a 3d altitude
+            coordinate
+
+        rho (iris.cube.Cube): Density
+
+        dtype (optional): Data type to do the calculations in (e.g.
+            numpy.float32 to halve the memory used). Default is the data type
+            of theta
+    """
+
+    def __init__(self, u, v, w, theta, rho, dtype=None):
+        if dtype is None:
+            dtype = theta.dtype
+        self.dtype = dtype
+        self.template = theta
+
+        self.fields = {}
+        for name, cube in [('u', u), ('v', v), ('w', w), ('theta', theta),
+                           ('rho', rho)]:
+            if plan_key(cube, 'level_height') != plan_key(
+                    theta, 'level_height'):
+                cube = RegridPlan(cube, theta, 'level_height').regrid(cube)
+            self.fields[name] = cube.data.astype(dtype, copy=False)
+
+        # Grid geometry
+        lon = grid.extract_dim_coord(theta, 'x')
+        lat = grid.extract_dim_coord(theta, 'y')
+        self._lon = np.deg2rad(lon.points).astype(dtype)
+        self._lat = np.deg2rad(lat.points).astype(dtype)
+        lat_3d = self._lat[np.newaxis, :, np.newaxis]
+
+        z = np.broadcast_to(theta.coord('altitude').points,
+                            theta.shape).astype(dtype)
+        self._r = (constants.r.data + z).astype(dtype)
+        self._coslat = np.cos(lat_3d)
+        self._tanlat = np.tan(lat_3d)
+
+        self._dz_dk = np.gradient(z, axis=0)
+        self._dz_dlon = np.gradient(z, self._lon, axis=2)
+        self._dz_dlat = np.gradient(z, self._lat, axis=1)
+
+        self._omega = self._planetary_rotation(theta.coord_system())
+
+        self._derivatives = {}
+        self._vorticity = None
+
+    def derivative(self, name, axis):
+        """Derivative of a field in the x, y or z direction
+
+        Args:
+            name (str): One of 'u', 'v', 'w' or 'theta'
+            axis (str): One of 'x', 'y' or 'z'
+
+        Returns:
+            numpy.ndarray:
+        """
+        key = (name, axis)
+        if key not in self._derivatives:
+            f = self.fields[name]
+            if axis == 'z':
+                df = np.gradient(f, axis=0) / self._dz_dk
+            elif axis == 'x':
+                df = ((np.gradient(f, self._lon, axis=2) -
+                       self._dz_dlon * self.derivative(name, 'z')) /
+                      (self._r * self._coslat))
+            elif axis == 'y':
+                df = ((np.gradient(f, self._lat, axis=1) -
+                       self._dz_dlat * self.derivative(name, 'z')) / self._r)
+            else:
+                raise ValueError('Unknown axis ' + str(axis))
+
+            self._derivatives[key] = df
+
+        return self._derivatives[key]
+
+    def vorticity(self):
+        """The relative vorticity vector (curl of the wind) in spherical
+        coordinates
+
+        Returns:
+            tuple: x, y and z components as numpy arrays
+        """
+        if self._vorticity is None:
+            u, v = self.fields['u'], self.fields['v']
+            d = self.derivative
+
+            xi_i = d('w', 'y') - d('v', 'z') - v / self._r
+            xi_j = d('u', 'z') + u / self._r - d('w', 'x')
+            xi_k = d('v', 'x') - d('u', 'y') + u * self._tanlat / self._r
+
+            self._vorticity = (xi_i, xi_j, xi_k)
+
+        return self._vorticity
+
+    def divergence(self):
+        """Three-dimensional divergence of the wind in spherical coordinates
+        """
+        v, w = self.fields['v'], self.fields['w']
+        d = self.derivative
+
+        return (d('u', 'x') + d('v', 'y') - v * self._tanlat / self._r +
+                d('w', 'z') + 2 * w / self._r)
+
+    def pv(self):
+        """Ertel potential vorticity from the absolute vorticity and the
+        gradient of theta
+        """
+        pv = np.zeros_like(self.fields['theta'])
+        for xi, omega, axis in zip(self.vorticity(), self._omega, 'xyz'):
+            pv += (xi + 2 * omega) * self.derivative('theta', axis)
+
+        return pv / self.fields['rho']
+
+    def cubes(self):
+        """Calculate all the derived diagnostics
+
+        Returns:
+            iris.cube.CubeList: The three components of vorticity, the
+                divergence and PV as cubes on the theta grid
+        """
+        xi_i, xi_j, xi_k = self.vorticity()
+
+        cubelist = CubeList()
+        for data, name, units in [
+                (xi_i, 'x_component_of_vorticity', 's-1'),
+                (xi_j, 'y_component_of_vorticity', 's-1'),
+                (xi_k, 'vertical_vorticity', 's-1'),
+                (self.divergence(), 'divergence', 's-1'),
+                (self.pv(), 'derived_pv', 'K m2 kg-1 s-1')]:
+            cube = self.template.copy(data=data)
+            cube.rename(name)
+            cube.units = units
+            cube.attributes.pop('STASH', None)
+            cubelist.append(cube)
+
+        return cubelist
+
+    def _planetary_rotation(self, cs):
+        """Components of the Earth's rotation vector in the local x, y and z
+        directions of the (possibly rotated) grid
+        """
+        # Direction of the Earth's axis in grid coordinates
+        if isinstance(cs, RotatedGeogCS):
+            lon_n, lat_n = rotate_pole(
+                np.array([0.]), np.array([90.]),
+                cs.grid_north_pole_longitude, cs.grid_north_pole_latitude)
+            lon_n, lat_n = np.deg2rad(lon_n[0]), np.deg2rad(lat_n[0])
+            axis = np.array([np.cos(lat_n) * np.cos(lon_n),
+                             np.cos(lat_n) * np.sin(lon_n),
+                             np.sin(lat_n)])
+        else:
+            axis = np.array([0., 0., 1.])
+
+        lon = self._lon[np.newaxis, :]
+        lat = self._lat[:, np.newaxis]
+        east = (-np.sin(lon), np.cos(lon), 0)
+        north = (-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon),
+                 np.cos(lat))
+        up = (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+              np.sin(lat))
+
+        omega = constants.omega.data
+        return [np.asarray(omega * sum(a * e for a, e in zip(axis, direction)),
+                           dtype=self.dtype)
+                for direction in (east, north, up)]
@@ -4,8 +4,10 @@
 import iris
 from irise import convert
 from myscripts import datadir
-from myscripts import files
+from myscripts import files, parallel
 from myscripts.files import stash_maps
+from myscripts.files.manifest import Manifest
+from myscripts.files.store import Store, OrderedWriter
 
 
 # Filename parameters
@@ -15,12 +17,29 @@ outpath = datadir + 'iop5_extended/'
 time = 'hours since 2011-11-28 00:00:00'
 nt = 48
 
+# Number of worker processes to spread the conversion over and the memory
+# limit for each worker (bytes). Set nproc = 1 to run each job in turn. Jobs
+# that fail are reported at the end rather than stopping the conversion
+nproc = 1
+max_memory = None
+
+# NetCDF storage for the output files (None, 'map', 'timeseries' or 'column').
+# See myscripts.files.profiles
+write_profile = None
+
+# Output either a set of files for each lead time ('files') or one time-series
+# file for each variable in outpath + 'store/' ('store')
+output_mode = 'files'
+
 # Define which area of grid to subset
 slices = slice(0, 50), slice(15, -15), slice(15, -15)
 
 # Load basis cube
-basis_cube = iris.load_cube(datadir + 'xjjhl/basis_cube.nc',
-                            'air_temperature')
+basis_file = datadir + 'xjjhl/basis_cube.nc'
+basis_cube = iris.load_cube(basis_file, 'air_temperature')
+
+# Regridding plans to the basis cube grid, reused for every file
+plans = {}
 
 # NDDiag names to extract
 nddiag_names = ['x_wind', 'y_wind', 'upward_air_velocity',
@@ -28,48 +47,158 @@ nddiag_names = ['x_wind', 'y_wind', 'upward_air_velocity',
                 'mass_fraction_of_cloud_liquid_water_in_air',
                 'mass_fraction_of_cloud_ice_in_air']
 
+# Prognostic variable names to extract (rho is unnamed in the prognostics file)
+prognostic_names = ['air_potential_temperature', 'unknown',
+                    'dimensionless_exner_function']
+
 # Single level diagnostic names to extract
 diag_names = ['boundary_layer_type', 'air_pressure_at_sea_level',
               'atmosphere_boundary_layer_thickness',
               'convective_rainfall_amount', 'stratiform_rainfall_amount']
 
+# STASH codes of the fields to load for each set of names. Only STASH
+# constraints are applied to the field headers by iris so the fields are
+# selected by STASH code rather than by name
+nddiag_stash = ['m01s00i002', 'm01s00i003', 'm01s00i150', 'm01s00i010',
+                'm01s00i254', 'm01s00i012']
+pressure_stash = dict(rho='m01s00i407', theta='m01s00i408')
+prognostic_stash = dict(theta='m01s00i004', rho='m01s00i253',
+                        exner='m01s00i406')
+diag_stash = ['m01s03i476', 'm01s16i222', 'm01s00i025', 'm01s05i201',
+              'm01s04i201']
+
 
 def main():
+    # Only convert files that are missing or have changed inputs since the
+    # last conversion
+    manifest = Manifest(outpath + 'manifest.json')
+
+    # Lead-time files are added to the store in order for each type of output
+    if output_mode == 'store':
+        store = Store(outpath + 'store/')
+        writers = {function: OrderedWriter(store)
+                   for function in (tracers, prognostics, diagnostics)}
+
+    entries = {}
+    jobs = []
+    for job in conversion_jobs():
+        outfile, infiles, parameters = job_sources(job)
+        entry = manifest.entry(infiles, parameters)
+        if manifest.is_current(outfile, entry,
+                               check_exists=output_mode == 'files'):
+            print('Skipping {}'.format(outfile))
+            if output_mode == 'store':
+                writers[job[1]].done.add(lead_time_index(job[0]))
+        else:
+            entries[job[0]] = (outfile, entry, job[1])
+            jobs.append(job)
+
+    def finished(name, result):
+        outfile, entry, function = entries[name]
+        if output_mode == 'store':
+            writers[function].add(lead_time_index(name), outfile,
+                                  lambda: manifest.record(outfile, entry))
+        else:
+            manifest.record(outfile, entry)
+
+    parallel.run(jobs, nproc=nproc, max_memory=max_memory, callback=finished)
+
+    # Write the lead times held back by failed conversions
+    if output_mode == 'store':
+        for function, writer in writers.items():
+            missing = writer.flush()
+            if missing:
+                print('{} lead times {} are not in the store'.format(
+                    function.__name__, missing))
+
+    return
+
+
+def conversion_jobs():
+    """Generate a job for each output file
+
+    Returns:
+        jobs (list): (name, function, args, kwargs) tuples for
+            :func:`myscripts.parallel.run`, one for each lead time and type of
+            output file
+    """
+    jobs = []
     for n in range(nt):
-        print(n)
         # Tracers
         infile = inpath + 'a' + str(n).zfill(strlen)
         outfile = outpath + 'pv_tracers_' + str(n + 1).zfill(strlen)
-        tracers(infile, outfile, stash_maps=[stash_maps.pv_tracers],
-                slices=slices, time=time)
+        jobs.append((outfile, tracers, (infile, outfile),
+                     dict(stash_maps=[stash_maps.pv_tracers],
+                          slices=slices, time=time)))
 
         # Prognostics
         nddiag_name = inpath + 'b' + str(n).zfill(strlen)
         progs_name = inpath + 'c' + str(n).zfill(strlen)
         outfile = outpath + 'prognostics_' + str(n + 1).zfill(strlen)
-        prognostics(nddiag_name, progs_name, outfile, slices=slices, time=time)
+        jobs.append((outfile, prognostics, (nddiag_name, progs_name, outfile),
+                     dict(slices=slices, time=time)))
 
         # Diagnostics
         infile = inpath + 'd' + str(n).zfill(strlen)
         outfile = outpath + 'diagnostics_' + str(n + 1).zfill(strlen)
-        diagnostics(infile, outfile, slices=slices[1:], time=time)
+        jobs.append((outfile, diagnostics, (infile, outfile),
+                     dict(slices=slices[1:], time=time)))
 
+    return jobs
 
-def tracers(infile, outfile, **kwargs):
-    cubes = iris.load(infile)
-    cubes = files.redo_cubes(cubes, basis_cube, **kwargs)
-    iris.save(cubes, outfile + '.nc')
+
+def lead_time_index(name):
+    """Position of a job's lead time from the number at the end of its name
+    """
+    return int(name[-strlen:]) - 1
+
+
+def job_sources(job):
+    """The output file, input files and parameters of a conversion job
+    """
+    name, function, args, kwargs = job
+    outfile = args[-1] + '.nc'
+    infiles = list(args[:-1]) + [basis_file]
+
+    parameters = dict(kwargs, function=function.__name__,
+                      write_profile=write_profile, output_mode=output_mode)
+    if function is prognostics:
+        parameters['names'] = nddiag_names + prognostic_names
+        parameters['stash_codes'] = (nddiag_stash +
+                                     sorted(pressure_stash.values()) +
+                                     sorted(prognostic_stash.values()))
+    elif function is diagnostics:
+        parameters['names'] = diag_names
+        parameters['stash_codes'] = diag_stash
+
+    return outfile, infiles, parameters
+
+
+def tracers(infile, outfile, stash_maps=(), **kwargs):
+    # Read only the tracer fields, using the header index of the file
+    cubes = iris.cube.CubeList()
+    mapped = set()
+    for stash_map in stash_maps:
+        cubes.extend(stash_map.load(infile))
+        mapped.update(str(stash) for stash in stash_map)
+
+    # The remaining fields are loaded as before, with the orography reference
+    cubes.extend(iris.load(infile, iris.AttributeConstraint(
+        STASH=lambda stash: str(stash) not in mapped)))
+    cubes = files.redo_cubes(cubes, basis_cube, plans=plans, **kwargs)
+    files.save(cubes, outfile + '.nc', profile=write_profile)
 
 
 def prognostics(nddiag_name, progs_name, outfile, **kwargs):
     # Extract u, v, w, q, q_cl and q_cf from the NDdiag file
-    cubes_all = iris.load(nddiag_name)
+    cubes_all = iris.load(nddiag_name, files.field_constraints(
+        stash_codes=nddiag_stash + list(pressure_stash.values())))
     cubes = convert.calc(nddiag_names, cubes_all)
 
     # Extract altitude to add to prognostic variables
-    P = cubes_all.extract('air_pressure')
-    z_rho = P[0].coord('altitude')
-    z_theta = P[1].coord('altitude')
+    z_rho = _extract_stash(cubes_all, pressure_stash['rho']).coord('altitude')
+    z_theta = _extract_stash(
+        cubes_all, pressure_stash['theta']).coord('altitude')
 
     # Extract rho, theta and exner on theta levels from prognostics file
     _prognostics(cubes, progs_name, z_rho, z_theta)
@@ -77,25 +206,27 @@ def prognostics(nddiag_name, progs_name, outfile, **kwargs):
     # Calculate derived diagnostics
     files.derived(cubes)
 
-    cubes = files.redo_cubes(cubes, basis_cube, **kwargs)
+    cubes = files.redo_cubes(cubes, basis_cube, plans=plans, **kwargs)
 
-    iris.save(cubes, outfile + '.nc')
+    files.save(cubes, outfile + '.nc', profile=write_profile)
 
 
 def diagnostics(infile, outfile, **kwargs):
-    cubes = files.load_cubes(infile, diag_names)
-    cubes = files.redo_cubes(cubes, basis_cube, **kwargs)
+    cubes = files.load_cubes(infile, diag_names, fields=(),
+                             stash_codes=diag_stash)
+    cubes = files.redo_cubes(cubes, basis_cube, plans=plans, **kwargs)
 
     # Remove names from bl type
     bl_type = cubes.extract('boundary_layer_type')[0]
     del bl_type.attributes['names']
 
-    iris.save(cubes, outfile + '.nc')
+    files.save(cubes, outfile + '.nc', profile=write_profile)
 
 
 def _prognostics(newcubes, filename, z_rho, z_theta):
     # Load the cubes
-    cubes = iris.load(filename)
+    cubes = iris.load(filename, files.field_constraints(
+        stash_codes=list(prognostic_stash.values())))
 
     # Extract theta
     theta = convert.calc('air_potential_temperature', cubes)
@@ -108,7 +239,7 @@ def _prognostics(newcubes, filename, z_rho, z_theta):
     rho.add_aux_coord(z_rho, [0, 1, 2])
 
     # Extract exner on theta levels (ignore on rho levels)
-    exner = cubes.extract('dimensionless_exner_function')[1]
+    exner = _extract_stash(cubes, prognostic_stash['exner'])
     exner.add_aux_coord(z_theta, [0, 1, 2])
 
     # Add the prognostics to the newcubelist
@@ -117,5 +248,9 @@ def _prognostics(newcubes, filename, z_rho, z_theta):
     return
 
 
+def _extract_stash(cubes, stash):
+    return cubes.extract(iris.AttributeConstraint(STASH=stash))[0]
+
+
 if __name__ == '__main__':
     main()
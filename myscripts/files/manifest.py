@@ -0,0 +1,109 @@
+"""Keep track of which converted files are up to date
+
+A manifest records the input files (path, size and modification time or a
+checksum of the contents) and the conversion parameters used to create each
+output file. An output only needs rebuilding if it is missing or the inputs or
+parameters have changed since it was created.
+"""
+
+import hashlib
+import json
+import os
+
+
+class Manifest(dict):
+    """Mapping of output filename to the inputs used to create it
+
+    Args:
+        filename (str): JSON file to store the manifest in. Existing records
+            are loaded from the file if it exists
+
+        checksum (bool): Identify input files by a checksum of their contents
+            rather than their size and modification time. Default is False
+    """
+
+    def __init__(self, filename, checksum=False):
+        super(Manifest, self).__init__()
+        self.filename = filename
+        self.checksum = checksum
+
+        if os.path.exists(filename):
+            with open(filename) as f:
+                self.update(json.load(f))
+
+    def entry(self, infiles, parameters):
+        """Describe the current state of the inputs to a conversion
+
+        Args:
+            infiles (list): Input filenames. Missing files are included
+                without a size or checksum so the entry is never current
+
+            parameters (dict): Conversion parameters
+
+        Returns:
+            dict: A JSON-serialisable record of the inputs and parameters
+        """
+        return {'inputs': [self._fingerprint(infile) for infile in infiles],
+                'parameters': _serialise(parameters)}
+
+    def is_current(self, outfile, entry, check_exists=True):
+        """Check whether an output file was created from the given inputs
+
+        Set check_exists=False for outputs that are not kept as separate
+        files (e.g. written to a store)
+        """
+        return ((os.path.exists(outfile) or not check_exists) and
+                self.get(outfile) == entry)
+
+    def record(self, outfile, entry):
+        """Record the inputs used to create an output file and save the
+        manifest
+        """
+        self[outfile] = entry
+        self.save()
+
+        return
+
+    def save(self):
+        # Write to a temporary file first so an interrupted save doesn't lose
+        # the existing records
+        tmpfile = self.filename + '.tmp'
+        with open(tmpfile, 'w') as f:
+            json.dump(self, f, indent=1, sort_keys=True)
+        os.replace(tmpfile, self.filename)
+
+        return
+
+    def _fingerprint(self, filename):
+        try:
+            if self.checksum:
+                md5 = hashlib.md5()
+                with open(filename, 'rb') as f:
+                    for block in iter(lambda: f.read(2 ** 20), b''):
+                        md5.update(block)
+                return [filename, md5.hexdigest()]
+            else:
+                stat = os.stat(filename)
+                return [filename, stat.st_size, stat.st_mtime]
+        except FileNotFoundError:
+            # A missing input never matches a record, so the conversion is
+            # still run and fails with the other jobs that failed
+            return [filename, None]
+
+
+def _serialise(value):
+    """Convert conversion parameters to a JSON-compatible form that compares
+    equal between runs
+    """
+    if isinstance(value, dict):
+        return {str(key): _serialise(value[key]) for key in value}
+    elif isinstance(value, (list, tuple)):
+        return [_serialise(x) for x in value]
+    elif isinstance(value, slice):
+        return ['slice', value.start, value.stop, value.step]
+    elif isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    elif hasattr(value, '__dict__'):
+        return _serialise(vars(value))
+    else:
+        return str(value)
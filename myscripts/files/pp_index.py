@@ -0,0 +1,334 @@
+"""Index the fields in a PP file or fieldsfile by STASH, time and level
+
+Building the index only reads the field headers. The index is saved next to
+the file (with '.idx.json' appended to the filename) and reused until the file
+changes, so a single field can be read with one seek rather than loading the
+whole file.
+"""
+
+import datetime
+import json
+import os
+import struct
+import numpy as np
+from iris.aux_factory import HybridHeightFactory
+from iris.coords import AuxCoord
+from iris.cube import CubeList
+from iris.fileformats import pp
+
+try:
+    import mo_pack
+except ImportError:
+    # Only needed to read WGDOS packed fields
+    mo_pack = None
+
+# Positions of header values (0-based) from UMDP F3
+LBYR, LBMON, LBDAT, LBHR, LBMIN = 0, 1, 2, 3, 4
+LBLREC = 14
+LBEXT, LBPACK = 19, 20
+LBEGIN, LBNREC = 28, 29
+LBLEV = 32
+LBUSER1, LBUSER4, LBUSER7 = 38, 41, 44
+BLEV = 51
+
+# Number of integer and real values in a field header
+NINT, NREAL = 45, 19
+
+# Fieldsfile fixed length header positions (0-based)
+LOOKUP_START, LOOKUP_DIM1, LOOKUP_DIM2 = 149, 150, 151
+
+# The orography field referenced by hybrid-height fields
+OROGRAPHY = 'm01s00i033'
+
+
+class PPIndex(object):
+    """Locations of the fields in a PP file or fieldsfile
+
+    Args:
+        filename (str):
+
+        word_size (int): 4 for PP files and 8 for fieldsfiles
+
+        fields (list): A dictionary for each field with the STASH code,
+            validity time, model level number (lblev), level value (blev),
+            the full header and the byte offset and length of the data
+
+    Attributes:
+        lookup (dict): The fields for each STASH code, in file order
+    """
+
+    def __init__(self, filename, word_size, fields):
+        self.filename = filename
+        self.word_size = word_size
+        self.fields = fields
+
+        self.lookup = {}
+        for field in fields:
+            self.lookup.setdefault(field['stash'], []).append(field)
+
+    @classmethod
+    def open(cls, filename):
+        """Load the index for a file, building it if it is missing or out of
+        date
+        """
+        stat = os.stat(filename)
+        try:
+            with open(index_filename(filename)) as f:
+                saved = json.load(f)
+            if (saved['size'] == stat.st_size and
+                    saved['mtime'] == stat.st_mtime):
+                return cls(filename, saved['word_size'], saved['fields'])
+        except (IOError, ValueError, KeyError):
+            pass
+
+        index = cls.build(filename)
+        try:
+            index.save()
+        except IOError:
+            # Still use the index if it can't be saved next to the file
+            pass
+
+        return index
+
+    @classmethod
+    def build(cls, filename):
+        """Build the index by reading the field headers
+        """
+        with open(filename, 'rb') as f:
+            if struct.unpack('>i', f.read(4))[0] == (NINT + NREAL) * 4:
+                word_size = 4
+                fields = _scan_pp(f)
+            else:
+                word_size = 8
+                fields = _scan_ff(f)
+
+        return cls(filename, word_size, fields)
+
+    def save(self):
+        stat = os.stat(self.filename)
+        with open(index_filename(self.filename), 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime': stat.st_mtime,
+                       'word_size': self.word_size, 'fields': self.fields}, f)
+
+        return
+
+    def find(self, stash_codes=None, time=None, level=None):
+        """Select fields from the index
+
+        Args:
+            stash_codes (list, optional): STASH codes as
+                iris.fileformats.pp.STASH or strings (e.g. 'm01s00i004')
+
+            time (datetime.datetime, optional): Validity time
+
+            level (int, optional): Model level number (LBLEV)
+
+        Returns:
+            list: The matching fields from the index
+        """
+        if stash_codes is None:
+            fields = self.fields
+        else:
+            # Only look through the fields with the selected STASH codes
+            stash_codes = set(str(stash) for stash in stash_codes)
+            fields = sorted(
+                [field for stash in stash_codes
+                 for field in self.lookup.get(stash, [])],
+                key=lambda field: field['offset'])
+        if time is not None:
+            time = _time_key(time)
+
+        return [field for field in fields if
+                (time is None or field['time'] == time) and
+                (level is None or field['lblev'] == level)]
+
+    def read(self, fields):
+        """Read the selected fields from the file
+
+        Args:
+            fields (list): Fields from the index
+
+        Returns:
+            list: iris.fileformats.pp.PPField objects with the data loaded
+        """
+        ppfields = []
+        with open(self.filename, 'rb') as f:
+            for field in fields:
+                f.seek(field['offset'])
+                ppfields.append(
+                    self._make_field(field['header'], f.read(field['length'])))
+
+        return ppfields
+
+    def load(self, fields):
+        """Read the selected fields and convert them to merged cubes
+
+        Hybrid-height cubes get the surface_altitude and derived altitude
+        coordinates from the orography field in the file, as with
+        :func:`iris.load`
+
+        Args:
+            fields (list): Fields from the index
+
+        Returns:
+            iris.cube.CubeList:
+        """
+        cubes = CubeList(
+            [cube for cube, field in pp.load_pairs_from_fields(
+                self.read(fields))]).merge()
+        self._add_hybrid_height(cubes)
+
+        return cubes
+
+    def _add_hybrid_height(self, cubes):
+        # iris only resolves the orography reference when loading whole
+        # files, so do the same for the cubes built from the index
+        cubes = [cube for cube in cubes if cube.coords('level_height') and
+                 cube.coords('sigma') and not cube.aux_factories]
+        orography = self.find([OROGRAPHY])
+        if len(cubes) == 0 or len(orography) == 0:
+            return
+        orography = self.read(orography[:1])[0]
+
+        for cube in cubes:
+            dims = (cube.coord_dims(cube.coord(axis='y', dim_coords=True)) +
+                    cube.coord_dims(cube.coord(axis='x', dim_coords=True)))
+            z_0 = AuxCoord(orography.data, standard_name='surface_altitude',
+                           units='m')
+            cube.add_aux_coord(z_0, dims)
+            cube.add_aux_factory(HybridHeightFactory(
+                delta=cube.coord('level_height'), sigma=cube.coord('sigma'),
+                orography=z_0))
+
+        return
+
+    def _make_field(self, header, data_bytes):
+        field = pp.make_pp_field(tuple(header))
+        field.data = _decode(field, data_bytes, self.word_size)
+
+        return field
+
+
+def index_filename(filename):
+    return filename + '.idx.json'
+
+
+def _scan_pp(f):
+    """Read the headers of a PP file (Fortran sequential records of 32-bit
+    big-endian words)
+    """
+    header_format = '>{}i{}f'.format(NINT, NREAL)
+
+    fields = []
+    f.seek(0)
+    while True:
+        record = f.read(4)
+        if len(record) < 4:
+            break
+        header = struct.unpack(header_format, f.read((NINT + NREAL) * 4))
+        f.read(4)
+
+        length = struct.unpack('>i', f.read(4))[0]
+        offset = f.tell()
+        f.seek(length + 4, os.SEEK_CUR)
+
+        fields.append(_describe(header, offset, length))
+
+    return fields
+
+
+def _scan_ff(f):
+    """Read the lookup table of a fieldsfile (64-bit big-endian words)
+    """
+    f.seek(0)
+    fixed_header = struct.unpack('>256q', f.read(256 * 8))
+    start = (fixed_header[LOOKUP_START] - 1) * 8
+    nwords = fixed_header[LOOKUP_DIM1]
+    nfields = fixed_header[LOOKUP_DIM2]
+
+    header_format = '>{}q{}d'.format(NINT, NREAL)
+
+    fields = []
+    for n in range(nfields):
+        f.seek(start + n * nwords * 8)
+        header = struct.unpack(header_format, f.read((NINT + NREAL) * 8))
+
+        # Unused lookup entries are filled with -99
+        if header[LBYR] == -99:
+            continue
+
+        fields.append(_describe(header, header[LBEGIN] * 8,
+                                _ff_data_bytes(header)))
+
+    return fields
+
+
+def _ff_data_bytes(header):
+    """Length of the data of a fieldsfile field in bytes
+
+    LBNREC is the number of 64-bit words the field takes up on disk, so it is
+    only the data length for WGDOS packed data. Otherwise the data is the
+    record (LBLREC words) less any extra data (LBEXT words)
+    """
+    packing = header[LBPACK] % 10
+    if packing == 1:
+        return header[LBNREC] * 8
+    elif packing == 2:
+        # CRAY 32-bit packing
+        return (header[LBLREC] - header[LBEXT]) * 4
+    else:
+        return (header[LBLREC] - header[LBEXT]) * 8
+
+
+def _decode(field, data_bytes, word_size):
+    """Convert the data of a field to a (masked) array of shape (lbrow,
+    lbnpt)
+    """
+    if field.lbpack.n2 != 0 or field.boundary_packing is not None:
+        raise ValueError('Compressed and boundary fields are not supported')
+
+    shape = (field.lbrow, field.lbnpt)
+    size = shape[0] * shape[1]
+    dtype = pp.LBUSER_DTYPE_LOOKUP.get(
+        field.lbuser[0], pp.LBUSER_DTYPE_LOOKUP['default'])
+
+    if field.lbpack.n1 == 0:
+        # Unpacked data uses the word size of the file
+        dtype = np.dtype('>{}{}'.format(dtype.kind, word_size))
+        data = np.frombuffer(data_bytes, dtype=dtype, count=size)
+    elif field.lbpack.n1 == 2:
+        data = np.frombuffer(data_bytes, dtype=np.dtype('>f4'), count=size)
+    elif field.lbpack.n1 == 1:
+        if mo_pack is None:
+            raise ValueError('Reading WGDOS packed fields requires mo_pack')
+        data = mo_pack.decompress_wgdos(data_bytes, shape[0], shape[1],
+                                        field.bmdi)
+    else:
+        raise ValueError('Unsupported packing LBPACK={}'.format(field.lbpack))
+
+    # Native byte order copy, so the data is writeable
+    data = data.astype(data.dtype.newbyteorder('=')).reshape(shape)
+    if data.dtype.kind == 'f' and field.bmdi in data:
+        data = np.ma.masked_values(data, field.bmdi, copy=False)
+
+    return data
+
+
+def _describe(header, offset, length):
+    stash = 'm{:02d}s{:02d}i{:03d}'.format(
+        header[LBUSER7], header[LBUSER4] // 1000, header[LBUSER4] % 1000)
+
+    return {'stash': stash,
+            'time': '{:04d}-{:02d}-{:02d} {:02d}:{:02d}'.format(
+                *header[LBYR:LBMIN + 1]),
+            'lblev': header[LBLEV],
+            'blev': header[BLEV],
+            'header': list(header),
+            'offset': offset,
+            'length': length}
+
+
+def _time_key(time):
+    if isinstance(time, datetime.datetime):
+        return time.strftime('%Y-%m-%d %H:%M')
+    return time
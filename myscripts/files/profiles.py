@@ -0,0 +1,66 @@
+"""NetCDF storage settings matched to how the converted files are read
+
+Each profile sets the chunk shape, compression and precision used when saving
+a cube:
+
+- 'map': One chunk per field for reading whole (3d) fields at one lead time
+- 'timeseries': One chunk per level for reading a single level from each
+  lead time
+- 'column': Full-depth chunks over small horizontal tiles for reading
+  profiles and cross sections
+"""
+
+import numpy as np
+
+
+class WriteProfile(object):
+    """NetCDF4 storage settings for saving cubes
+
+    Attributes:
+        chunks: Function returning the chunk shape for a given cube shape
+
+        complevel (int): zlib compression level (0 for no compression)
+
+        shuffle (bool): Apply the HDF5 shuffle filter before compression
+
+        float32 (bool): Store 64-bit floating point data as 32-bit
+    """
+
+    def __init__(self, chunks, complevel=4, shuffle=True, float32=False):
+        self.chunks = chunks
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.float32 = float32
+
+    def prepare(self, cube):
+        """Return a cube ready to save and the keywords for
+        :meth:`iris.fileformats.netcdf.Saver.write`
+        """
+        if self.float32 and cube.dtype == np.float64:
+            cube = cube.copy(data=cube.core_data().astype(np.float32))
+
+        kwargs = dict(zlib=self.complevel > 0, complevel=self.complevel,
+                      shuffle=self.shuffle)
+        if cube.ndim > 0:
+            kwargs['chunksizes'] = self.chunks(cube.shape)
+
+        return cube, kwargs
+
+
+def whole_field(shape):
+    return tuple(shape)
+
+
+def single_level(shape):
+    return (1,) * (len(shape) - 2) + tuple(shape[-2:])
+
+
+def column_tiles(shape, size=32):
+    return tuple(shape[:-2]) + tuple(min(n, size) for n in shape[-2:])
+
+
+profiles = {
+    'map': WriteProfile(whole_field),
+    'timeseries': WriteProfile(single_level),
+    'column': WriteProfile(column_tiles),
+}
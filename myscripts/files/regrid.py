@@ -0,0 +1,133 @@
+"""Reusable linear regridding from one model grid to another
+
+The interpolation indices and weights only depend on the source and target
+grids, so they are calculated once in a :class:`RegridPlan` and then applied to
+any number of cubes on the same source grid. The result matches regridding
+with :class:`iris.analysis.Linear` in the horizontal and then interpolating
+linearly in the vertical, as :func:`irise.interpolate.remap_3d` does.
+"""
+
+import numpy as np
+from irise import grid
+
+
+class RegridPlan(object):
+    """Precomputed linear interpolation from a source grid to a target grid
+
+    Args:
+        source (iris.cube.Cube): A cube on the source grid. The horizontal
+            coordinates (and the vertical coordinate if `z_name` is given)
+            must be dimension coordinates
+
+        target (iris.cube.Cube): A 3d (z, y, x) cube on the target grid
+
+        z_name (str, optional): Name of the vertical coordinate to interpolate
+            along. Default is None, which gives a horizontal (2d) regridding
+
+    Attributes:
+        weights (list): (axis name, lower indices, upper indices, weights) for
+            each axis of the source grid
+    """
+
+    def __init__(self, source, target, z_name=None):
+        axes = ['y', 'x']
+        if z_name is not None:
+            axes = ['z'] + axes
+
+        self.weights = []
+        for axis in axes:
+            if axis == 'z':
+                src = source.coord(z_name)
+                tgt = target.coord(z_name)
+            else:
+                src = grid.extract_dim_coord(source, axis)
+                tgt = grid.extract_dim_coord(target, axis)
+
+                if src.coord_system != tgt.coord_system:
+                    raise ValueError('Source and target ' + axis +
+                                     ' coordinates have different '
+                                     'coordinate systems')
+
+            points = tgt.units.convert(tgt.points, src.units)
+            self.weights.append(
+                (src.name(),) + _linear_weights(src.points, points))
+
+        # Template for the output cubes with the target coordinates
+        if z_name is None:
+            self._target = target[0]
+            for factory in self._target.aux_factories:
+                self._target.remove_aux_factory(factory)
+            for coord in self._target.aux_coords:
+                self._target.remove_coord(coord)
+        else:
+            self._target = target.copy()
+
+        for coord in self._target.coords(dimensions=()):
+            self._target.remove_coord(coord)
+
+    def regrid(self, cube):
+        """Regrid a cube using the precomputed weights
+
+        Args:
+            cube (iris.cube.Cube): A cube on the same grid as the source cube
+                used to create the plan
+
+        Returns:
+            iris.cube.Cube: The cube on the target grid
+        """
+        if cube.ndim != len(self.weights):
+            raise ValueError('Cube has {} dimensions but the regridding plan '
+                             'is for {} dimensions'.format(
+                                 cube.ndim, len(self.weights)))
+
+        # Put the data in the same dimension order as the plan
+        order = [cube.coord_dims(name)[0] for name, _, _, _ in self.weights]
+        data = np.transpose(cube.data, order)
+
+        for axis, (name, lower, upper, weights) in enumerate(self.weights):
+            data = _interpolate(data, axis, lower, upper, weights)
+
+        newcube = self._target.copy(data=data)
+        newcube.metadata = cube.metadata
+        for coord in cube.coords(dimensions=()):
+            newcube.add_aux_coord(coord.copy())
+
+        return newcube
+
+
+def plan_key(cube, z_name=None):
+    """A hashable key identifying the grid of a cube
+
+    Cubes with the same key can share a :class:`RegridPlan`
+    """
+    coords = [grid.extract_dim_coord(cube, axis) for axis in ['y', 'x']]
+    if z_name is not None:
+        coords.append(cube.coord(z_name))
+
+    return tuple((coord.name(), coord.points.tobytes()) for coord in coords)
+
+
+def _linear_weights(source, target):
+    """Indices and weights for linear interpolation from source to target
+
+    Points outside the source range are linearly extrapolated from the two
+    nearest source points, matching the default extrapolation of
+    :class:`iris.analysis.Linear`.
+    """
+    order = np.argsort(source)
+    points = source[order]
+
+    idx = np.searchsorted(points, target) - 1
+    idx = np.clip(idx, 0, len(points) - 2)
+    weights = (target - points[idx]) / (points[idx + 1] - points[idx])
+
+    return order[idx], order[idx + 1], weights
+
+
+def _interpolate(data, axis, lower, upper, weights):
+    shape = [1] * data.ndim
+    shape[axis] = len(weights)
+    weights = weights.reshape(shape)
+
+    return (np.take(data, lower, axis=axis) * (1 - weights) +
+            np.take(data, upper, axis=axis) * weights)
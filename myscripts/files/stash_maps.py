@@ -1,10 +1,33 @@
 from iris.fileformats.pp import STASH
+from myscripts.files.pp_index import PPIndex
 
 
 class StashMap(dict):
     """
     """
 
+    def load(self, filename, time=None, level=None):
+        """Load and remap only the fields in this StashMap from a PP file or
+        fieldsfile
+
+        Uses the header index of the file (see
+        :class:`myscripts.files.pp_index.PPIndex`) so the other fields are
+        not read
+
+        Args:
+            filename (str):
+            time (datetime.datetime, optional): Only load this validity time
+            level (int, optional): Only load this model level number
+
+        Returns:
+            iris.cube.CubeList:
+        """
+        index = PPIndex.open(filename)
+        cubes = index.load(index.find(self.keys(), time=time, level=level))
+        self.remap_cubelist(cubes)
+
+        return cubes
+
     def remap_cube(self, cube):
         stash = cube.attributes['STASH']
         self[stash].modify_cube(cube)
@@ -0,0 +1,182 @@
+"""Consolidated time-series stores of converted forecasts
+
+Each variable is kept in its own NetCDF file with an unlimited time dimension
+and one chunk per time and level, so a time series of one variable is read
+from a single file rather than from every lead-time file.
+"""
+
+import os
+import numpy as np
+import netCDF4
+from cf_units import Unit
+import iris
+from iris.fileformats import netcdf
+from iris.util import new_axis
+from myscripts.files.profiles import profiles
+
+
+class Store(object):
+    """A directory of per-variable NetCDF files
+
+    Args:
+        path (str): Directory containing the files
+
+        profile (str or myscripts.files.profiles.WriteProfile): Storage
+            settings for new files. Default is 'timeseries'
+    """
+
+    def __init__(self, path, profile='timeseries'):
+        self.path = path
+        if isinstance(profile, str):
+            profile = profiles[profile]
+        self.profile = profile
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def filename(self, cube):
+        """The file storing a variable
+        """
+        name = cube.name()
+        # Custom variables without names are identified by STASH code
+        if name == 'unknown' and 'STASH' in cube.attributes:
+            name += '_' + str(cube.attributes['STASH'])
+
+        return os.path.join(self.path, name + '.nc')
+
+    def write(self, cubes, index):
+        """Write each cube into its store at the given position in time
+
+        Args:
+            cubes (iris.cube.CubeList): Cubes at a single time
+
+            index (int): Position along the time dimension. Must be no
+                greater than the number of times already in each store
+        """
+        for cube in cubes:
+            filename = self.filename(cube)
+            if os.path.exists(filename):
+                _write_record(cube, filename, index)
+            elif index == 0:
+                self._create(cube, filename)
+            else:
+                raise ValueError('Can not write time {} to new store {}'.format(
+                    index, filename))
+
+        return
+
+    def _create(self, cube, filename):
+        cube, kwargs = self.profile.prepare(new_axis(cube, 'time'))
+        with netcdf.Saver(filename, 'NETCDF4') as saver:
+            saver.write(cube, unlimited_dimensions=['time'], **kwargs)
+            saver.update_global_attributes(
+                Conventions=netcdf.CF_CONVENTIONS_VERSION)
+
+        return
+
+
+class OrderedWriter(object):
+    """Write lead-time files into a store in time order
+
+    Lead times can finish in any order (e.g. when converted in parallel) but
+    are only written to the store once all earlier lead times are in the
+    store, so the times in the store are always in order. Lead times that
+    never arrive (e.g. failed conversions) hold back the later ones until
+    :meth:`flush` is called.
+
+    Args:
+        store (Store):
+
+        done (list): Indices of lead times already in the store
+    """
+
+    def __init__(self, store, done=()):
+        self.store = store
+        self.done = set(done)
+        self.ready = {}
+        self.next = 0
+        self.missing = []
+
+    def add(self, index, filename, callback=None):
+        """Write a lead-time file to the store when all earlier lead times
+        have been written
+
+        Args:
+            index (int): Position of the lead time
+
+            filename (str): Converted file for the lead time. Deleted once it
+                has been written to the store
+
+            callback (optional): Function with no arguments called after the
+                file has been written to the store
+        """
+        self.ready[index] = (filename, callback)
+        self._write_ready()
+
+        return
+
+    def flush(self):
+        """Write the remaining lead times, skipping any missing earlier ones
+
+        Returns:
+            list: Indices of the lead times left out of the store. Lead times
+                that arrive after a later lead time is already in the store
+                can't be inserted and are also left out (their files are
+                kept); the store needs rebuilding to include them
+        """
+        while self.ready:
+            self._write_ready()
+            if self.ready:
+                self.missing.append(self.next)
+                self.next += 1
+
+        return sorted(self.missing)
+
+    def _write_ready(self):
+        while True:
+            if self.next in self.done:
+                self.next += 1
+            elif self.next in self.ready:
+                filename, callback = self.ready.pop(self.next)
+                if any(index > self.next for index in self.done):
+                    # Only appending to the stores is supported
+                    self.missing.append(self.next)
+                    self.next += 1
+                    continue
+                # Lead times are appended, so the record is the number of lead
+                # times already in the store
+                self.store.write(iris.load(filename), len(self.done))
+                os.remove(filename)
+                if callback is not None:
+                    callback()
+                self.done.add(self.next)
+                self.next += 1
+            else:
+                break
+
+        return
+
+
+def _write_record(cube, filename, index):
+    with netCDF4.Dataset(filename, 'a') as dataset:
+        time = dataset.variables['time']
+        units = Unit(time.units,
+                     calendar=getattr(time, 'calendar', 'standard'))
+        coord = cube.coord('time')
+
+        time[index] = coord.units.convert(coord.points[0], units)
+        bounds = getattr(time, 'bounds', None)
+        if coord.has_bounds() and bounds is not None:
+            dataset.variables[bounds][index] = coord.units.convert(
+                coord.bounds[0], units)
+
+        # The data variable is the only non-coordinate variable with a time
+        # dimension and the dimensions of the cube
+        for variable in dataset.variables.values():
+            if (variable.dimensions[:1] == ('time',) and
+                    variable.name not in dataset.dimensions and
+                    variable.name != bounds and
+                    variable.ndim == cube.ndim + 1):
+                variable[index] = np.ma.asanyarray(cube.data)
+
+    return
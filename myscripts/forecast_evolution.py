@@ -3,9 +3,9 @@
 
 import matplotlib.pyplot as plt
 import iris.plot as iplt
-from irise import convert
 from irise.plot.util import add_map
 from myscripts import plotdir
+from myscripts.files import cache
 from myscripts.models.um import case_studies
 
 columns = 3
@@ -21,7 +21,8 @@ def main(forecast, name, levels, *args,  **kwargs):
         print(row, column)
         ax = plt.subplot2grid((rows, columns), (row, column))
 
-        cube = convert.calc(name, cubes, levels=levels)[0]
+        # Reuse the diagnostic from previous runs if the files are unchanged
+        cube = cache.calc(forecast, name, levels=levels)[0]
         im = iplt.pcolormesh(cube, *args, **kwargs)
         add_map()
 
@@ -14,17 +14,15 @@ def forecast_errors(forecast1, forecast2, cs):
     z1 = iris.load_cube(forecast1, cs)
     z2 = iris.load_cube(forecast2, cs)
 
-    diff = z1 - z2
-
-    rms_diff = statistics.rms_diff(z1, z2)
-    mean_diff = statistics.mean_diff(z1, z2)
+    mean, rms, mae, max_diff, min_diff, count = statistics.error_statistics(
+        z1, z2)
 
     print('\n'.join([
         'Forecast errors in {}'.format(z1.name()),
-        'RMS Error: {}'.format(np.squeeze(rms_diff.data)),
-        'Mean Error: {}'.format(np.squeeze(mean_diff.data)),
-        'Max Error: {}'.format(diff.data.max()),
-        'Min Error: {}'.format(diff.data.min())
+        'RMS Error: {}'.format(np.squeeze(rms.data)),
+        'Mean Error: {}'.format(np.squeeze(mean.data)),
+        'Max Error: {}'.format(max_diff.data.max()),
+        'Min Error: {}'.format(min_diff.data.min())
     ]))
 
     return
@@ -1,11 +1,14 @@
 import os
 import datetime as dt
 import parse
+import numpy as np
 import pandas as pd
 import iris
 from iris.coords import AuxCoord, DimCoord
+from iris.cube import Cube, CubeList
 from cf_units import Unit
-from myscripts.models.speedy import datadir
+from myscripts import parallel
+from myscripts.models.speedy import datadir, grads
 
 
 def main():
@@ -24,7 +27,12 @@ def main():
     # Expected number of timesteps (to check if forecast completed successfully)
     nt = 32
 
-    cubes = gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt)
+    # Number of processes to read the files with. Set to None to read and
+    # merge each file in turn
+    nproc = None
+
+    cubes = gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt,
+                        nproc=nproc)
     print(cubes)
     path = datadir
     iris.save(cubes, path + str(t0.year) + '-' + str(t1.year) + '_' +
@@ -33,7 +41,8 @@ def main():
     return
 
 
-def gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt):
+def gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt, nproc=None,
+                suffix='.nc'):
     """
     Filenames follow the structure '{prefix}_{precision}.nc' where prefix is a
     generic prefix or the date in the format '{YYYYMMDDHH}'.
@@ -46,11 +55,22 @@ def gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt):
         pmin (int): Lowest precision forecast (sbits)
         pmax (int): Highest precision forecast (sbits)
         nt (int): Expected number of timesteps in each forecast
+        nproc (int, optional): Read the files in parallel with this many
+            processes and put them directly into arrays (see
+            :func:`gather_arrays`). Default is None which loads each file in
+            turn and merges the cubes
+        suffix (str): '.nc' for files converted with grd2nc.sh or '.ctl' to
+            read the GrADS output directly (see
+            :mod:`myscripts.models.speedy.grads`)
 
     Returns:
         cubes (iris.cube.CubeList): A cubelist containing all forecasts with
             cubes merged over new coordinates of start time and precision
     """
+    if nproc is not None:
+        return gather_arrays(path, prefix, t0, t1, pmin, pmax, nens, nt, nproc,
+                             suffix)
+
     all_cubes = iris.cube.CubeList()
 
     # Loop over start dates
@@ -70,7 +90,12 @@ def gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt):
             for m in range(1, nens+1):
                 print('{}.{}'.format(n, m))
                 mcoord = AuxCoord(points=m, long_name='ensemble_member')
-                cubes = iris.load('{}_p{}_e{}.nc'.format(filename, n, m))
+                cubes = load('{}_p{}_e{}{}'.format(filename, n, m, suffix))
+
+                # GrADS forecasts that haven't written any times yet
+                if len(cubes) == 0:
+                    print('No output written')
+                    continue
 
                 # Set the time coordinate as start_time and forecast_period
                 t0_dt(cubes)
@@ -90,6 +115,139 @@ def gather_data(path, prefix, t0, t1, pmin, pmax, nens, nt):
     return cubes
 
 
+def gather_arrays(path, prefix, t0, t1, pmin, pmax, nens, nt, nproc=None,
+                  suffix='.nc'):
+    """Read the forecasts in parallel into arrays of every start time,
+    precision and ensemble member
+
+    Each file is read in a separate process and its data put straight into
+    an array with dimensions of (forecast_reference_time, precision,
+    ensemble_member, forecast_period, ...), so the cubes are built once
+    rather than merged. Forecasts that didn't complete (with a number of
+    timesteps other than nt) or failed to load are masked and the number of
+    each is printed.
+
+    Args:
+        path, prefix, t0, t1, pmin, pmax, nens, nt, suffix: See
+            :func:`gather_data`
+        nproc (int, optional): Number of processes. Default is the number of
+            CPUs
+
+    Returns:
+        iris.cube.CubeList:
+    """
+    times = pd.date_range(t0, t1, freq='MS')
+    precisions = range(pmin, pmax + 1)
+    members = range(1, nens + 1)
+
+    jobs = []
+    for i, time in enumerate(times):
+        if prefix == 'yyyymmddhh':
+            filename = path + time.strftime('%Y%m%d%H')
+        else:
+            filename = path + prefix
+        for j, n in enumerate(precisions):
+            for k, m in enumerate(members):
+                jobs.append(((i, j, k), _read_file,
+                             ('{}_p{}_e{}{}'.format(filename, n, m, suffix),
+                              nt),
+                             {}))
+
+    # Preallocated when the first forecast is read
+    shape = (len(times), len(precisions), len(members))
+    templates, arrays = {}, {}
+    start_times = {}
+    failed, incomplete = [], []
+    for index, cubes, error in parallel.imap(jobs, nproc=nproc):
+        if error is not None:
+            print('Failed {}\n{}'.format(index, error))
+            failed.append(index)
+            continue
+        elif len(cubes) == 0:
+            incomplete.append(index)
+            continue
+
+        # Use the start time from the file rather than the expected one
+        start_times.setdefault(
+            index[0], cubes[0].coord('forecast_reference_time').points[0])
+        for cube in cubes:
+            name = cube.name()
+            if name not in arrays:
+                templates[name] = cube
+                arrays[name] = np.ma.masked_all(shape + cube.shape,
+                                                dtype=cube.dtype)
+            arrays[name][index] = cube.data
+
+    print('{} of {} forecasts failed to load and {} were incomplete'.format(
+        len(failed), len(jobs), len(incomplete)))
+
+    # Forecast start times in the units used by t0_dt. Start times without
+    # any complete forecasts use the expected start time
+    units = Unit('hours since 1982-01-01 00:00:00', calendar='standard')
+    coords = [
+        DimCoord([start_times.get(i, units.date2num(time.to_pydatetime()))
+                  for i, time in enumerate(times)],
+                 standard_name='forecast_reference_time', units=units),
+        DimCoord(list(precisions), long_name='precision'),
+        DimCoord(list(members), long_name='ensemble_member')]
+
+    cubes = CubeList()
+    for name in arrays:
+        cube = _build_cube(arrays[name], templates[name], coords)
+        set_units_from_name(cube)
+        cubes.append(cube)
+
+    return cubes
+
+
+def load(filename):
+    """Load a forecast from NetCDF or GrADS (.ctl) output
+    """
+    if filename.endswith('.ctl'):
+        return grads.load(filename)
+    else:
+        return iris.load(filename)
+
+
+def _read_file(filename, nt):
+    cubes = load(filename)
+    if len(cubes) == 0:
+        return cubes
+    t0_dt(cubes)
+
+    # Only include the cubes if the forecast successfully ran. Load the data
+    # here so it is sent back rather than read again by the main process
+    complete = CubeList()
+    for cube in cubes:
+        if len(cube.coord('forecast_period').points) == nt:
+            cube.data
+            complete.append(cube)
+
+    return complete
+
+
+def _build_cube(data, template, coords):
+    """A cube with new leading dimensions and the metadata of the template
+    """
+    cube = Cube(data)
+    cube.metadata = template.metadata
+    ndim = len(coords)
+
+    for n, coord in enumerate(coords):
+        cube.add_dim_coord(coord, n)
+
+    for coord in template.coords(dim_coords=True):
+        cube.add_dim_coord(coord.copy(), ndim + template.coord_dims(coord)[0])
+
+    for coord in template.coords(dim_coords=False):
+        if coord.name() == 'forecast_reference_time':
+            continue
+        dims = tuple(ndim + dim for dim in template.coord_dims(coord))
+        cube.add_aux_coord(coord.copy(), dims)
+
+    return cube
+
+
 def t0_dt(cubes):
     """Change time units from time to start time and lead time
     """
@@ -0,0 +1,203 @@
+"""Read SPEEDY GrADS output (.ctl and .grd files) directly into iris cubes
+
+An alternative to converting the files to NetCDF with grd2nc.sh/grd2nc_p.sh.
+The .grd files are memory mapped and wrapped as lazy arrays, so only the parts
+of the files that are used are read. The cubes match the NetCDF files from
+the conversion scripts: the variable descriptions (e.g. 'Temperature [K]')
+are used as the names so :func:`gather_nc.get_name_and_units` can split them,
+and the levels are 'pressure' (hPa) or 'sigma'.
+"""
+
+import datetime
+import os
+import re
+import numpy as np
+import dask.array as da
+from cf_units import Unit
+from iris.coords import DimCoord
+from iris.cube import Cube, CubeList
+
+months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct',
+          'nov', 'dec']
+
+
+def load(filename):
+    """Load all the variables described by a .ctl file
+
+    Args:
+        filename (str): The .ctl file
+
+    Returns:
+        iris.cube.CubeList: Cubes with lazy data for the times available in
+            the .grd files. Empty if no times have been written
+    """
+    ctl = parse_ctl(filename)
+
+    dtype = np.dtype('f4').newbyteorder(
+        '>' if 'big_endian' in ctl['options'] else '<')
+    nx, ny = len(ctl['xdef']), len(ctl['ydef'])
+    nrecords = sum(max(nlev, 1) for name, nlev, description in ctl['vars'])
+
+    # One block of records for each time, either all in one file or a file
+    # for each time. Only map the times that have been written so forecasts
+    # that stopped early load with fewer times
+    block_size = nrecords * ny * nx * dtype.itemsize
+    if 'template' in ctl['options']:
+        blocks = []
+        for time in ctl['tdef']:
+            dset = _expand_template(ctl['dset'], time)
+            if not os.path.exists(dset) or os.path.getsize(dset) < block_size:
+                break
+            blocks.append(np.memmap(dset, dtype=dtype, mode='r',
+                                    shape=(1, nrecords, ny, nx)))
+    else:
+        ntimes = min(len(ctl['tdef']),
+                     os.path.getsize(ctl['dset']) // block_size)
+        blocks = []
+        if ntimes > 0:
+            blocks.append(np.memmap(ctl['dset'], dtype=dtype, mode='r',
+                                    shape=(ntimes, nrecords, ny, nx)))
+    ntimes = sum(block.shape[0] for block in blocks)
+    if ntimes == 0:
+        return CubeList()
+
+    coords = _coords(ctl)
+    coords[0] = coords[0][:ntimes]
+
+    cubes = CubeList()
+    record = 0
+    for name, nlev, description in ctl['vars']:
+        nrec = max(nlev, 1)
+        data = da.concatenate(
+            [da.from_array(block[:, record:record + nrec],
+                           chunks=(1, nrec, ny, nx)) for block in blocks])
+        record += nrec
+
+        # yrev data is written north to south, so flip it to match the
+        # ascending ydef latitudes. Compare with undef at the precision of
+        # the data or the float32 fill value isn't matched
+        if 'yrev' in ctl['options']:
+            data = data[..., ::-1, :]
+        data = da.ma.masked_values(data, data.dtype.type(ctl['undef']))
+
+        if nlev == 0:
+            data = data[:, 0]
+            dim_coords = [coords[0], coords[2], coords[3]]
+        else:
+            dim_coords = coords
+        dim_coords = [(coord.copy(), n) for n, coord in enumerate(dim_coords)]
+        cube = Cube(data, long_name=description, var_name=name.lower(),
+                    dim_coords_and_dims=dim_coords)
+        cubes.append(cube)
+
+    return cubes
+
+
+def parse_ctl(filename):
+    """Read the GrADS data descriptor file
+
+    Args:
+        filename (str):
+
+    Returns:
+        dict: dset (the data filename), title, undef, options, xdef, ydef,
+            zdef (arrays of the grid points), tdef (list of
+            datetime.datetime) and vars (list of (name, number of levels,
+            description))
+    """
+    with open(filename) as f:
+        words = [line.split() for line in f if line.strip() and
+                 not line.startswith('*')]
+
+    ctl = dict(options=[], vars=[])
+    n = 0
+    while n < len(words):
+        keyword = words[n][0].lower()
+        if keyword == 'dset':
+            dset = words[n][1]
+            if dset.startswith('^'):
+                dset = os.path.join(os.path.dirname(filename), dset[1:])
+            ctl['dset'] = dset
+        elif keyword == 'title':
+            ctl['title'] = ' '.join(words[n][1:])
+        elif keyword == 'undef':
+            ctl['undef'] = float(words[n][1])
+        elif keyword == 'options':
+            ctl['options'] += [word.lower() for word in words[n][1:]]
+        elif keyword in ('xdef', 'ydef', 'zdef'):
+            size, mapping = int(words[n][1]), words[n][2].lower()
+            values = words[n][3:]
+            if mapping == 'levels':
+                # The levels can continue over several lines
+                while len(values) < size:
+                    n += 1
+                    values += words[n]
+                ctl[keyword] = np.array(values[:size], dtype=float)
+            else:
+                start, step = float(values[0]), float(values[1])
+                ctl[keyword] = start + step * np.arange(size)
+        elif keyword == 'tdef':
+            size, start, step = int(words[n][1]), words[n][3], words[n][4]
+            start, step = _parse_time(start), _parse_increment(step)
+            ctl['tdef'] = [start + m * step for m in range(size)]
+        elif keyword == 'vars':
+            for m in range(int(words[n][1])):
+                n += 1
+                line = words[n]
+                ctl['vars'].append((line[0], int(line[1]), ' '.join(line[3:])))
+        n += 1
+
+    return ctl
+
+
+def _coords(ctl):
+    units = Unit('hours since ' + str(ctl['tdef'][0]), calendar='standard')
+    time = DimCoord([units.date2num(t) for t in ctl['tdef']],
+                    standard_name='time', units=units)
+
+    # SPEEDY writes either pressure levels (hPa) or sigma levels
+    z = ctl['zdef']
+    if z.max() > 1:
+        z = DimCoord(z, long_name='pressure', units='hPa')
+    else:
+        z = DimCoord(z, long_name='sigma')
+
+    lat = DimCoord(ctl['ydef'], standard_name='latitude', units='degrees')
+    lon = DimCoord(ctl['xdef'], standard_name='longitude', units='degrees')
+
+    return [time, z, lat, lon]
+
+
+def _parse_time(word):
+    """Parse a GrADS absolute time, e.g. 00Z01JAN1982 or 06:30Z1jan1982
+    """
+    match = re.match(r'(?:(\d+)(?::(\d+))?z)?(\d+)?([a-z]{3})(\d{4})',
+                     word.lower())
+    hour, minute, day, month, year = match.groups()
+
+    return datetime.datetime(int(year), months.index(month) + 1,
+                             int(day or 1), int(hour or 0), int(minute or 0))
+
+
+def _parse_increment(word):
+    match = re.match(r'(\d+)([a-z]{2})', word.lower())
+    number, units = int(match.group(1)), match.group(2)
+    if units == 'mn':
+        return datetime.timedelta(minutes=number)
+    elif units == 'hr':
+        return datetime.timedelta(hours=number)
+    elif units == 'dy':
+        return datetime.timedelta(days=number)
+    else:
+        raise ValueError('Unsupported time increment ' + word)
+
+
+def _expand_template(dset, time):
+    for code, value in [('%y4', '{:04d}'.format(time.year)),
+                        ('%m2', '{:02d}'.format(time.month)),
+                        ('%d2', '{:02d}'.format(time.day)),
+                        ('%h2', '{:02d}'.format(time.hour)),
+                        ('%n2', '{:02d}'.format(time.minute))]:
+        dset = dset.replace(code, value)
+
+    return dset
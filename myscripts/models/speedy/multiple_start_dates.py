@@ -8,10 +8,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import iris
 from iris.time import PartialDateTime
-from iris.analysis import STD_DEV, MEAN
 from irise import plot
 from myscripts import datadir
-from myscripts.statistics import rms_diff
+from myscripts.statistics import Accumulator, rms_diff
 from myscripts.models.speedy import plotdir
 
 
@@ -33,15 +32,19 @@ def main():
         rp = iris.load(path + '*_10-30.nc', cs)
         rp = rp.concatenate_cube()
 
-    # Calculate the global RMS error at each forecast lead time
-    diff = rms_diff(rp, fp)
+    # Calculate the global RMS error at each forecast lead time, one start
+    # date at a time so only one forecast is loaded at once
+    acc = Accumulator('forecast_reference_time')
+    for rp_slice in rp.slices_over('forecast_reference_time'):
+        frt = rp_slice.coord('forecast_reference_time').cell(0).point
+        fp_slice = fp.extract(iris.Constraint(
+            forecast_reference_time=lambda cell: cell.point == frt))
+        acc.update(rms_diff(rp_slice, fp_slice))
 
     # Calculate the mean error as a function of precision and the standard error
     # of the mean for each lead time
-    mean = diff.collapsed('forecast_reference_time', MEAN)
-    std_dev = diff.collapsed('forecast_reference_time', STD_DEV)
-    std_err = (std_dev /
-               np.sqrt(len(diff.coord('forecast_reference_time').points)))
+    mean = acc.mean()
+    std_err = acc.std_dev() / np.sqrt(acc.n)
 
     for mean_slice, std_slice in zip(mean.slices(['precision']),
                                      std_err.slices(['precision'])):
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import numpy as np
 
 
@@ -8,14 +9,41 @@ def rearrange(cube):
     """
     nx = cube.shape[-2]
     mx = cube.shape[-1]
+    n, m, l = _indices(nx, mx)
 
-    x = cube.copy(data=np.zeros_like(cube.data))
+    data = np.zeros_like(cube.data)
+    data[..., n, l] = cube.data[..., n, m]
+
+    x = cube.copy(data=data)
     x.coord('longitude').rename('total_wavenumber')
     x.coord('latitude').rename('zonal_wavenumber')
-    for n in range(nx):
-        for m in range(mx):
-            l = m + n
-            if l < mx:
-                x.data[..., n, l] = cube.data[..., n, m]
 
     return x
+
+
+def unarrange(cube):
+    """The inverse of :func:`rearrange`. Put spectral data from total
+    wavenumber vs zonal wavenumber back in the SPEEDY layout
+    """
+    nx = cube.shape[-2]
+    mx = cube.shape[-1]
+    n, m, l = _indices(nx, mx)
+
+    data = np.zeros_like(cube.data)
+    data[..., n, m] = cube.data[..., n, l]
+
+    x = cube.copy(data=data)
+    x.coord('total_wavenumber').rename('longitude')
+    x.coord('zonal_wavenumber').rename('latitude')
+
+    return x
+
+
+@lru_cache()
+def _indices(nx, mx):
+    # Element [n, m] of the SPEEDY layout goes to [n, m + n] for m + n < mx
+    n, m = np.meshgrid(np.arange(nx), np.arange(mx), indexing='ij')
+    keep = (m + n) < mx
+    n, m = n[keep], m[keep]
+
+    return n, m, m + n
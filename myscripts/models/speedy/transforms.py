@@ -0,0 +1,126 @@
+"""Spectral transforms on the SPEEDY Gaussian grids
+
+Converts between gridpoint fields and triangularly truncated spherical
+harmonic coefficients. The Gaussian latitudes and normalised associated
+Legendre functions are calculated once for each truncation and reused, and
+the Legendre transform of every field in a (e.g. time series) array is done
+as one batched matrix product for each zonal wavenumber.
+
+The spectral coefficients have shape (..., zonal wavenumber, total
+wavenumber) with zeros where the total wavenumber is less than the zonal
+wavenumber.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+# Number of longitudes and latitudes of the SPEEDY grids for each truncation
+grids = {30: (96, 48), 39: (120, 60)}
+
+
+@lru_cache()
+def gaussian_latitudes(nlat):
+    """Latitudes (degrees, south to north) and Gaussian quadrature weights
+
+    The weights sum to 2
+    """
+    mu, weights = np.polynomial.legendre.leggauss(nlat)
+
+    return np.rad2deg(np.arcsin(mu)), weights
+
+
+@lru_cache()
+def legendre(truncation, nlat):
+    """Normalised associated Legendre functions at the Gaussian latitudes
+
+    Normalised so the mean of the square of each function over the sphere is
+    one, calculated with the standard recurrence relations
+
+    Returns:
+        numpy.ndarray: Shape (truncation + 1, truncation + 1, nlat) ordered as
+            zonal wavenumber, total wavenumber, latitude
+    """
+    lat, weights = gaussian_latitudes(nlat)
+    mu = np.sin(np.deg2rad(lat))
+    coslat = np.sqrt(1 - mu ** 2)
+
+    nm = truncation + 1
+    p = np.zeros([nm, nm, nlat])
+    p[0, 0] = 1
+    for m in range(1, nm):
+        p[m, m] = np.sqrt((2 * m + 1) / (2 * m)) * coslat * p[m - 1, m - 1]
+    for m in range(nm - 1):
+        p[m, m + 1] = np.sqrt(2 * m + 3) * mu * p[m, m]
+    for m in range(nm):
+        for n in range(m + 2, nm):
+            a = np.sqrt((4 * n ** 2 - 1) / (n ** 2 - m ** 2))
+            b = np.sqrt(((n - 1) ** 2 - m ** 2) / (4 * (n - 1) ** 2 - 1))
+            p[m, n] = a * (mu * p[m, n - 1] - b * p[m, n - 2])
+
+    return p
+
+
+@lru_cache()
+def _analysis_matrix(truncation, nlat):
+    # Legendre functions times the quadrature weights, as (m, latitude, n)
+    lat, weights = gaussian_latitudes(nlat)
+    p = legendre(truncation, nlat) * weights / 2
+
+    return np.ascontiguousarray(p.transpose(0, 2, 1))
+
+
+@lru_cache()
+def _synthesis_matrix(truncation, nlat):
+    # Legendre functions as (m, n, latitude)
+    return np.ascontiguousarray(legendre(truncation, nlat))
+
+
+def to_spectral(data, truncation):
+    """Spherical harmonic coefficients of gridpoint fields
+
+    Args:
+        data (numpy.ndarray): Fields on the Gaussian grid with shape (...,
+            latitude, longitude) and latitudes ordered south to north
+        truncation (int): e.g. 30 for T30
+
+    Returns:
+        numpy.ndarray: Complex coefficients with shape (..., truncation + 1,
+            truncation + 1)
+    """
+    nlat, nlon = data.shape[-2:]
+    nm = truncation + 1
+
+    # Fourier transform along each latitude circle
+    fourier = np.fft.rfft(data, axis=-1)[..., :nm] / nlon
+
+    # Legendre transform as a matrix product for each zonal wavenumber
+    shape = fourier.shape[:-2]
+    fourier = fourier.reshape(-1, nlat, nm).transpose(2, 0, 1)
+    spectral = np.matmul(fourier, _analysis_matrix(truncation, nlat))
+
+    return spectral.transpose(1, 0, 2).reshape(shape + (nm, nm))
+
+
+def to_grid(spectral, nlat=None, nlon=None):
+    """Gridpoint fields from spherical harmonic coefficients
+
+    Args:
+        spectral (numpy.ndarray): Coefficients with shape (..., truncation +
+            1, truncation + 1) as returned by :func:`to_spectral`
+        nlat, nlon (int, optional): Size of the Gaussian grid. Default is the
+            SPEEDY grid for the truncation
+
+    Returns:
+        numpy.ndarray: Fields with shape (..., nlat, nlon)
+    """
+    nm = spectral.shape[-1]
+    truncation = nm - 1
+    if nlat is None or nlon is None:
+        nlon, nlat = grids[truncation]
+
+    shape = spectral.shape[:-2]
+    spectral = spectral.reshape(-1, nm, nm).transpose(1, 0, 2)
+    fourier = np.matmul(spectral, _synthesis_matrix(truncation, nlat))
+    fourier = fourier.transpose(1, 2, 0).reshape(shape + (nlat, nm))
+
+    return np.fft.irfft(fourier * nlon, n=nlon, axis=-1)
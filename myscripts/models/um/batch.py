@@ -0,0 +1,134 @@
+"""Calculate a diagnostic for every lead time of a set of forecasts
+
+Each (start date, lead time) pair is calculated as a separate job across a
+process pool and the result saved as a checkpoint file, so an interrupted
+batch only recalculates the missing results when run again. The results are
+merged into cubes with forecast_index and forecast_lead_time dimensions.
+
+Example:
+    >>> from myscripts.models.um import batch
+    >>> start_dates = [datetime(2013, 11, 1) + timedelta(days=n)
+    ...                for n in range(92)]
+    >>> cubes = batch.run(my_diagnostic, start_dates, range(0, 61, 6),
+    ...                   datadir + 'season/my_diagnostic/', nproc=8)
+"""
+
+import os
+import iris
+from iris.coords import AuxCoord
+from iris.cube import CubeList
+from iris.util import promote_aux_coord_to_dim_coord
+from myscripts import parallel
+from myscripts.models.um import case_studies
+
+
+def run(diagnostic, start_dates, lead_times, path, generate=None, nproc=None,
+        max_memory=None):
+    """Calculate a diagnostic for each forecast and lead time in parallel
+
+    Args:
+        diagnostic: Function taking the cubelist at one lead time and
+            returning an iris.cube.Cube or iris.cube.CubeList. Must be defined
+            at the top level of a module so it can be sent to the worker
+            processes
+
+        start_dates (list): datetime.datetime start time of each forecast
+
+        lead_times (list): Lead times in hours
+
+        path (str): Directory for the checkpoint files. Remove any existing
+            files if the diagnostic has changed
+
+        generate (optional): Function taking a start time and returning the
+            forecast. Default is
+            :func:`myscripts.models.um.case_studies.generate_season_forecast`
+
+        nproc, max_memory: See :func:`myscripts.parallel.imap`
+
+    Returns:
+        iris.cube.CubeList: The diagnostics merged along the forecast_index
+            and forecast_lead_time dimensions. A ValueError listing the
+            missing checkpoint files is raised if any of the jobs failed
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    checkpoints = []
+    jobs = []
+    for index, start_time in enumerate(start_dates):
+        for lead_time in lead_times:
+            filename = checkpoint_filename(path, start_time, lead_time)
+            checkpoints.append(filename)
+            if not os.path.exists(filename):
+                jobs.append((filename, calculate,
+                             (diagnostic, start_time, index, lead_time,
+                              filename),
+                             dict(generate=generate)))
+
+    print('{} of {} results already calculated'.format(
+        len(checkpoints) - len(jobs), len(checkpoints)))
+    parallel.run(jobs, nproc=nproc, max_memory=max_memory)
+
+    # The results can only be merged into complete forecast_index and
+    # forecast_lead_time dimensions
+    missing = [filename for filename in checkpoints
+               if not os.path.exists(filename)]
+    if missing:
+        raise ValueError(
+            '{} checkpoints are missing. Run again to calculate them:\n{}'
+            .format(len(missing), '\n'.join(missing)))
+
+    return merge(checkpoints)
+
+
+def calculate(diagnostic, start_time, index, lead_time, filename,
+              generate=None):
+    """Calculate the diagnostic for one forecast and lead time and save it
+    to a checkpoint file
+    """
+    if generate is None:
+        generate = _season_forecast
+    forecast = generate(start_time)
+    cubes = forecast.set_lead_time(hours=lead_time)
+
+    result = diagnostic(cubes)
+    if isinstance(result, iris.cube.Cube):
+        result = CubeList([result])
+
+    for cube in result:
+        cube.add_aux_coord(AuxCoord(index, long_name='forecast_index'))
+        cube.add_aux_coord(AuxCoord(lead_time, long_name='forecast_lead_time',
+                                    units='hours'))
+
+    # Save to a temporary file first so an interrupted job doesn't leave an
+    # incomplete checkpoint
+    tmpfile = filename + '.tmp.nc'
+    iris.save(result, tmpfile)
+    os.replace(tmpfile, filename)
+
+    return
+
+
+def merge(filenames):
+    """Merge checkpoint files into cubes with forecast_index and
+    forecast_lead_time dimensions
+    """
+    cubes = iris.load_raw(filenames).merge()
+
+    for cube in cubes:
+        for coord in ['forecast_index', 'forecast_lead_time']:
+            if (cube.coords(coord) and not cube.coords(coord, dim_coords=True)
+                    and len(cube.coord_dims(coord)) == 1):
+                promote_aux_coord_to_dim_coord(cube, coord)
+
+    return cubes
+
+
+def checkpoint_filename(path, start_time, lead_time):
+    return os.path.join(path, '{}_T+{}.nc'.format(
+        start_time.strftime('%Y%m%d%H'), str(lead_time).zfill(2)))
+
+
+def _season_forecast(start_time):
+    return case_studies.generate_season_forecast(
+        start_time.year, start_time.month, start_time.day)
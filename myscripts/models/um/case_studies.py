@@ -1,19 +1,60 @@
 """Generate forecast objects for case studies
+
+The case studies (e.g. `case_studies.iop5b`) are only created the first time
+they are used. :func:`get` creates a new forecast for a case that only opens
+the files holding the given variables.
 """
 from datetime import datetime, timedelta
+from functools import partial
 from irise.forecast import Forecast
 from myscripts import datadir
+from myscripts.files import stash_maps
+from myscripts.models.um.forecast import (CachedForecast, StoreForecast,
+                                          SubdomainForecast)
+
+
+def generate_forecast(start_time, lead_times, job_id, filenames, suffix='.nc',
+                      max_bytes=None, variables=None, subdomain=None):
+    """
+    Args:
+        max_bytes (int, optional): Keep recently used lead times in memory up
+            to this many bytes (see
+            :class:`myscripts.models.um.forecast.CachedForecast`). Default is
+            None which reloads the files every time
 
+        variables (list, optional): Only use the files holding these
+            variables (see :func:`select_files`). Default is all files
+
+        subdomain (myscripts.models.um.forecast.Subdomain, optional): Only
+            load this region of each field. Default is the whole domain
+    """
+    if variables is not None:
+        filenames = select_files(filenames, variables)
 
-def generate_forecast(start_time, lead_times, job_id, filenames, suffix='.nc'):
     mapping = {}
     for n, dt in enumerate(lead_times, start=1):
         mapping[start_time + dt] = make_filenames(job_id, filenames, n, suffix)
 
-    return Forecast(start_time, mapping)
+    return _make_forecast(start_time, mapping, max_bytes, subdomain)
+
 
+def generate_store_forecast(start_time, lead_times, job_id):
+    """A forecast converted with output_mode = 'store' in
+    myscripts.files.forecasts
+    """
+    filenames = datadir + job_id + '/store/*.nc'
+    mapping = {start_time + dt: filenames for dt in lead_times}
 
-def generate_analyses(start_time, dt, nt):
+    return StoreForecast(start_time, mapping)
+
+
+def generate_analyses(start_time, dt, nt, job_id, max_bytes=None,
+                      subdomain=None):
+    """
+    Args:
+        max_bytes, subdomain: See :func:`generate_forecast`. Each analysis is
+            a single file, so there is no variables argument
+    """
     dt = timedelta(hours=dt)
     mapping = {}
     for n in range(nt):
@@ -22,7 +63,18 @@ def generate_analyses(start_time, dt, nt):
                          str(time)[0:10].replace('-', '') +
                          '_analysis' + str(time)[11:13] + '.nc')
 
-    return Forecast(start_time, mapping)
+    return _make_forecast(start_time, mapping, max_bytes, subdomain)
+
+
+def _make_forecast(start_time, mapping, max_bytes, subdomain):
+    if subdomain is None:
+        forecast = Forecast(start_time, mapping)
+    else:
+        forecast = SubdomainForecast(start_time, mapping, subdomain)
+    if max_bytes is not None:
+        forecast = CachedForecast(forecast, max_bytes)
+
+    return forecast
 
 
 def make_filenames(job_id, filenames, n, suffix):
@@ -45,66 +97,156 @@ def generate_season_forecast(YYYY, MM, DD):
     return Forecast(start_time, mapping)
 
 
+# Variables in each type of file written by myscripts.files.forecasts
+_tracer_names = [stash.name for stash in stash_maps.pv_tracers.values()]
+catalogue = {
+    'prognostics_': [
+        'x_wind', 'y_wind', 'upward_air_velocity', 'specific_humidity',
+        'mass_fraction_of_cloud_liquid_water_in_air',
+        'mass_fraction_of_cloud_ice_in_air', 'air_density',
+        'air_potential_temperature', 'dimensionless_exner_function',
+        'x_component_of_vorticity', 'y_component_of_vorticity',
+        'vertical_vorticity', 'divergence', 'derived_pv'],
+    'diagnostics_': [
+        'boundary_layer_type', 'air_pressure_at_sea_level',
+        'atmosphere_boundary_layer_thickness', 'convective_rainfall_amount',
+        'stratiform_rainfall_amount'],
+    'pv_tracers_': _tracer_names,
+    'pv_tracer_mono_': _tracer_names,
+    'theta_tracers_': [stash.name
+                       for stash in stash_maps.theta_tracers.values()],
+}
+
+
+def select_files(filenames, variables):
+    """The filename prefixes needed to load the given variables
+
+    Args:
+        filenames (list): Filename prefixes of a case study (e.g.
+            'prognostics_')
+
+        variables (list): Names of variables stored in the files
+
+    Returns:
+        list: The prefixes of files holding any of the variables. All the
+            prefixes are returned if a variable isn't in the catalogue of any
+            of the files (e.g. variables calculated by irise.convert)
+    """
+    selected = []
+    for name in variables:
+        for filename in filenames:
+            if name in catalogue.get(filename, ()):
+                if filename not in selected:
+                    selected.append(filename)
+                break
+        else:
+            return list(filenames)
+
+    # Keep the original order of the files
+    return [filename for filename in filenames if filename in selected]
+
+
+# Arguments to generate_forecast for each case study
 # DIAMET IOP5
-start_time = datetime(2011, 11, 28, 12)
-lead_times = [timedelta(hours=n) for n in range(1, 37)]
-
-# Original IOP5 forecast with dynamics-tracer inconsistency including pressure
-# solver increments
-job_id = 'xjjhq'
-filenames = ['xjjhqa_']
-iop5 = generate_forecast(
-    start_time, lead_times, job_id, filenames, suffix='.pp')
-
+_iop5 = dict(start_time=datetime(2011, 11, 28, 12),
+             lead_times=[timedelta(hours=n) for n in range(1, 37)])
+_iop5_early = dict(start_time=datetime(2011, 11, 28),
+                   lead_times=[timedelta(hours=n) for n in range(1, 49)])
 
-job_id = 'iop5'
-# Dynamics-tracer inconsistency using basic diagnostic without pressure solver
-# increments
-filenames = ['prognostics_', 'diagnostics_', 'pv_tracers_']
-iop5b = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# Same as iop5b but using monotone limiter for PV tracer advection
-filenames = ['prognostics_', 'diagnostics_', 'pv_tracer_mono_']
-iop5_mono = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# Theta tracers
-filenames = ['prognostics_', 'diagnostics_', 'theta_tracers_']
-iop5_theta = generate_forecast(start_time, lead_times, job_id, filenames)
+# DIAMET IOP8
+_iop8 = dict(start_time=datetime(2011, 12, 7, 12),
+             lead_times=[timedelta(hours=n) for n in range(1, 37)])
+_iop8_files = ['prognostics_', 'diagnostics_', 'pv_tracers_',
+               'theta_tracers_']
+
+cases = {
+    # Original IOP5 forecast with dynamics-tracer inconsistency including
+    # pressure solver increments
+    'iop5': dict(_iop5, job_id='xjjhq', filenames=['xjjhqa_'], suffix='.pp'),
+
+    # Dynamics-tracer inconsistency using basic diagnostic without pressure
+    # solver increments
+    'iop5b': dict(_iop5, job_id='iop5',
+                  filenames=['prognostics_', 'diagnostics_', 'pv_tracers_']),
+
+    # Same as iop5b but using monotone limiter for PV tracer advection
+    'iop5_mono': dict(
+        _iop5, job_id='iop5',
+        filenames=['prognostics_', 'diagnostics_', 'pv_tracer_mono_']),
+
+    # Theta tracers
+    'iop5_theta': dict(
+        _iop5, job_id='iop5',
+        filenames=['prognostics_', 'diagnostics_', 'theta_tracers_']),
+
+    # IOP5 with start time 12-hours earlier
+    'iop5_early': dict(
+        _iop5_early, job_id='iop5_early',
+        filenames=['prognostics_', 'diagnostics_', 'pv_tracers_']),
+
+    # IOP5 early start time with extended domain
+    'iop5_extended': dict(
+        _iop5_early, job_id='iop5_extended',
+        filenames=['prognostics_', 'diagnostics_', 'pv_tracers_']),
+
+    # IOP5 global
+    'iop5_global': dict(
+        _iop5_early, job_id='iop5_global',
+        filenames=['prognostics_', 'diagnostics_', 'pv_tracers_']),
+
+    # Dynamics-tracer inconsistency using basic diagnostic without pressure
+    # solver increments
+    'iop8': dict(_iop8, job_id='iop8', filenames=_iop8_files),
+
+    # IOP8 with long-wave radiation increments set to zero
+    'iop8_no_lw': dict(_iop8, job_id='iop8_no_lw', filenames=_iop8_files),
+
+    # IOP8 with latent heat set to small numbers
+    'iop8_no_microphysics': dict(_iop8, job_id='iop8_no_microphysics',
+                                 filenames=_iop8_files),
+}
 
 # Analyses
-iop5_analyses = generate_analyses(start_time, 6, 7)
-
-# IOP5 with start time 12-hours earlier
-job_id = 'iop5_early'
-start_time = datetime(2011, 11, 28)
-lead_times = [timedelta(hours=n) for n in range(1, 49)]
-filenames = ['prognostics_', 'diagnostics_', 'pv_tracers_']
-iop5_early = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# IOP5 early start time with extended domain
-job_id = 'iop5_extended'
-iop5_extended = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# IOP5 global
-job_id = 'iop5_global'
-iop5_global = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# DIAMET IOP8
-job_id = 'iop8'
-filenames = ['prognostics_', 'diagnostics_', 'pv_tracers_', 'theta_tracers_']
-start_time = datetime(2011, 12, 7, 12)
-lead_times = [timedelta(hours=n) for n in range(1, 37)]
-
-# Dynamics-tracer inconsistency using basic diagnostic without pressure solver
-# increments
-iop8 = generate_forecast(start_time, lead_times, job_id, filenames)
-iop8_analyses = generate_analyses(start_time, 6, 7)
-
-# IOP8 with long-wave radiation increments set to zero
-job_id = 'iop8_no_lw'
-iop8_no_lw = generate_forecast(start_time, lead_times, job_id, filenames)
-
-# IOP8 with latent heat set to small numbers
-job_id = 'iop8_no_microphysics'
-iop8_no_microphysics = generate_forecast(
-    start_time, lead_times, job_id, filenames)
+analyses = {
+    'iop5_analyses': partial(generate_analyses, _iop5['start_time'], 6, 7,
+                             'iop5'),
+    'iop8_analyses': partial(generate_analyses, _iop8['start_time'], 6, 7,
+                             'iop8'),
+}
+
+# Forecasts already created by module attribute access
+_forecasts = {}
+
+
+def get(name, **kwargs):
+    """Create a new forecast object for a case study
+
+    Args:
+        name (str): Name of the case study (e.g. 'iop5b')
+
+        **kwargs: Extra arguments to :func:`generate_forecast` (e.g.
+            variables=['air_potential_temperature'] or
+            subdomain=Subdomain(box=(-10, 5, 45, 65))) or
+            :func:`generate_analyses`. Arguments that don't apply to the case
+            study raise a TypeError
+
+    Returns:
+        irise.forecast.Forecast:
+    """
+    if name in cases:
+        return generate_forecast(**dict(cases[name], **kwargs))
+    elif name in analyses:
+        return analyses[name](**kwargs)
+    else:
+        raise KeyError('Unknown case study ' + str(name))
+
+
+def __getattr__(name):
+    # Create each case study once, the first time it is used
+    if name in cases or name in analyses:
+        if name not in _forecasts:
+            _forecasts[name] = get(name)
+        return _forecasts[name]
+
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
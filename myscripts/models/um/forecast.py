@@ -0,0 +1,389 @@
+"""Forecast objects with custom loading of each lead time
+"""
+
+from collections import OrderedDict
+from datetime import timedelta
+from queue import Full, Queue
+import threading
+import numpy as np
+import iris
+from iris.cube import CubeList
+from iris.exceptions import CoordinateNotFoundError
+from irise import grid
+from irise.forecast import Forecast
+
+# HDF5 and the netCDF library aren't thread safe, so only one thread at a
+# time reads or writes files while a forecast is being prefetched
+file_lock = threading.Lock()
+
+
+def forecast_files(forecast):
+    """The mapping of each time in a forecast to its files
+
+    irise doesn't expose the files of a forecast, so this is the one place
+    that reads them from the forecast's loader
+
+    Args:
+        forecast (irise.forecast.Forecast):
+
+    Returns:
+        dict: datetime.datetime to filename or list of filenames
+    """
+    return forecast._loader._files
+
+
+class StoreForecast(Forecast):
+    """A forecast read from consolidated time-series stores
+
+    Every lead time maps to the same set of per-variable store files (see
+    :mod:`myscripts.files.store`) and only the requested time is extracted
+    from them.
+
+    Args:
+        start_time (datetime.datetime):
+
+        mapping (dict): Mapping of time to the store filenames
+    """
+
+    def __init__(self, start_time, mapping):
+        super(StoreForecast, self).__init__(start_time, mapping)
+        self.mapping = dict(mapping)
+
+    def __iter__(self):
+        for time in self.times:
+            yield self.set_time(time)
+
+    @property
+    def times(self):
+        return sorted(self.mapping)
+
+    def filenames(self, time):
+        """The store files holding the given time
+        """
+        return self.mapping[time]
+
+    def copy(self):
+        return StoreForecast(self.start_time, self.mapping)
+
+    def set_time(self, time):
+        self.cubelist = iris.load(
+            self.filenames(time),
+            iris.Constraint(time=lambda cell: cell.point == time))
+        self.current_time = time
+
+        return self.cubelist
+
+
+class Subdomain(object):
+    """A region of the model grid to load
+
+    Cubes are sliced before their data is loaded, so only the region is read
+    from the files and anything calculated from the cubes is calculated on
+    the reduced grid.
+
+    Args:
+        slices (tuple, optional): Index slices along the y and x dimensions
+            (e.g. (slice(100, 280), slice(100, 350)))
+
+        box (tuple, optional): (lon_min, lon_max, lat_min, lat_max) in true
+            longitude and latitude. The smallest grid-aligned rectangle
+            containing all points in the box is used, so for a rotated grid
+            the region can include points outside the box
+
+        levels (tuple, optional): (lower, upper) limits on the vertical
+            coordinate of 3d cubes, inclusive. A ValueError is raised for 3d
+            cubes with no levels inside the limits
+
+    Only one of slices and box can be given
+    """
+
+    def __init__(self, slices=None, box=None, levels=None):
+        if slices is not None and box is not None:
+            raise ValueError('Subdomain can not have both slices and box')
+        self.slices = slices
+        self.box = box
+        self.levels = levels
+
+        # Index slices for each horizontal grid (e.g. staggered winds)
+        self._horizontal = {}
+
+    def extract(self, cube):
+        """The part of the cube inside the subdomain
+        """
+        index = [slice(None)] * cube.ndim
+
+        try:
+            x = grid.extract_dim_coord(cube, 'x')
+            y = grid.extract_dim_coord(cube, 'y')
+        except CoordinateNotFoundError:
+            x = y = None
+        if x is not None and (self.slices is not None or
+                              self.box is not None):
+            yslice, xslice = self._xy_slices(cube, x, y)
+            index[cube.coord_dims(y)[0]] = yslice
+            index[cube.coord_dims(x)[0]] = xslice
+
+        if self.levels is not None and cube.ndim == 3:
+            z = grid.extract_dim_coord(cube, 'z')
+            lower, upper = self.levels
+            inside = np.where((z.points >= lower) & (z.points <= upper))[0]
+            if len(inside) == 0:
+                raise ValueError('No levels of {} inside {}'.format(
+                    cube.name(), self.levels))
+            index[cube.coord_dims(z)[0]] = slice(inside[0], inside[-1] + 1)
+
+        return cube[tuple(index)]
+
+    def _xy_slices(self, cube, x, y):
+        key = (x.name(), x.points[0], x.points[-1], len(x.points),
+               y.name(), y.points[0], y.points[-1], len(y.points))
+        if key not in self._horizontal:
+            if self.slices is not None:
+                self._horizontal[key] = tuple(self.slices)
+            else:
+                self._horizontal[key] = self._box_slices(cube, x, y)
+
+        return self._horizontal[key]
+
+    def _box_slices(self, cube, x, y):
+        lon_min, lon_max, lat_min, lat_max = self.box
+        lon, lat = grid.true_coords(cube)
+        lon = (lon + 180) % 360 - 180
+        inside = ((lon >= lon_min) & (lon <= lon_max) &
+                  (lat >= lat_min) & (lat <= lat_max))
+
+        # true_coords are 2d arrays with dimensions ordered as in the cube
+        if cube.coord_dims(y)[0] > cube.coord_dims(x)[0]:
+            inside = inside.transpose()
+        rows = np.where(inside.any(axis=1))[0]
+        columns = np.where(inside.any(axis=0))[0]
+        if len(rows) == 0:
+            raise ValueError('No grid points inside ' + str(self.box))
+
+        return (slice(rows[0], rows[-1] + 1),
+                slice(columns[0], columns[-1] + 1))
+
+
+class SubdomainForecast(Forecast):
+    """A forecast that only loads a subdomain of each cube
+
+    Args:
+        start_time (datetime.datetime):
+
+        mapping (dict): Mapping of time to filenames
+
+        subdomain (Subdomain):
+    """
+
+    def __init__(self, start_time, mapping, subdomain):
+        super(SubdomainForecast, self).__init__(start_time, mapping)
+        self.subdomain = subdomain
+
+    def copy(self):
+        return SubdomainForecast(self.start_time, forecast_files(self),
+                                 self.subdomain)
+
+    def set_time(self, time):
+        cubes = super(SubdomainForecast, self).set_time(time)
+        self.cubelist = CubeList(
+            [self.subdomain.extract(cube) for cube in cubes])
+
+        return self.cubelist
+
+
+class CachedForecast(object):
+    """Keep recently used lead times of a forecast in memory
+
+    Wraps a forecast object so that repeated calls to set_time or
+    set_lead_time for the same time, or iterating over the forecast more than
+    once, don't reload the files. The least recently used lead times are
+    dropped when the cached cubes exceed the byte budget. The cached cubelists
+    are returned directly so changes made to them (e.g. appending derived
+    cubes) are kept in the cache.
+
+    Args:
+        forecast (irise.forecast.Forecast):
+
+        max_bytes (int): Budget for the cached cubes in bytes. The size of a
+            cubelist is the size of its data whether or not it has been
+            loaded. Default is 2 GB
+
+    Attributes:
+        hits (int): Number of lead times returned from the cache
+
+        misses (int): Number of lead times loaded from the files
+
+        nbytes (int): Size of the currently cached cubes
+    """
+
+    def __init__(self, forecast, max_bytes=2 * 1024 ** 3):
+        self.forecast = forecast
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._cache = OrderedDict()
+        self.cubelist = None
+        self.current_time = None
+
+    def __getattr__(self, attr):
+        # Everything else (e.g. start_time) comes from the wrapped forecast
+        if attr == 'forecast':
+            raise AttributeError(attr)
+        return getattr(self.forecast, attr)
+
+    def __iter__(self):
+        for time in self.times:
+            yield self.set_time(time)
+
+    def __len__(self):
+        return len(self.forecast)
+
+    @property
+    def times(self):
+        return sorted(forecast_files(self.forecast))
+
+    def copy(self):
+        """A new cached forecast with an empty cache
+        """
+        return CachedForecast(self.forecast.copy(), self.max_bytes)
+
+    def set_lead_time(self, *args, **kwargs):
+        if len(args) == 1 and isinstance(args[0], timedelta):
+            lead_time = args[0]
+        else:
+            lead_time = timedelta(*args, **kwargs)
+
+        return self.set_time(self.start_time + lead_time)
+
+    def set_time(self, time):
+        if time in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(time)
+            cubelist = self._cache[time][0]
+        else:
+            self.misses += 1
+            cubelist = self.forecast.set_time(time)
+            nbytes = _nbytes(cubelist)
+            self._cache[time] = (cubelist, nbytes)
+            self.nbytes += nbytes
+
+            # Drop the least recently used lead times but always keep the
+            # one just loaded
+            while self.nbytes > self.max_bytes and len(self._cache) > 1:
+                self.nbytes -= self._cache.popitem(last=False)[1][1]
+
+        self.cubelist = cubelist
+        self.current_time = time
+
+        return cubelist
+
+    def clear(self):
+        """Remove all lead times from the cache
+        """
+        self._cache.clear()
+        self.nbytes = 0
+
+        return
+
+
+def prefetch(forecast, lead_times=None, depth=1, load_data=True,
+             constraints=None):
+    """Iterate over a forecast while loading the next lead times in the
+    background
+
+    The lead times are loaded on a separate thread from a copy of the
+    forecast, so reading the files overlaps with the calculations done on the
+    previous lead time. The thread is stopped when the loop finishes or exits
+    early (e.g. break or an error).
+
+    The background thread holds :data:`file_lock` while it reads the files
+    and reads the points and bounds of every coordinate as well as the data,
+    so the cubes it yields don't go back to the files. Anything else in the
+    loop that reads or writes files (e.g. saving results or using the data of
+    cubes loaded with load_data=False) must also hold :data:`file_lock`.
+
+    Args:
+        forecast (irise.forecast.Forecast):
+
+        lead_times (list, optional): datetime.timedelta lead times to load.
+            Default is all times in the forecast
+
+        depth (int): Maximum number of loaded lead times waiting to be used.
+            Default is 1
+
+        load_data (bool): Load the data of each cube in the background. With
+            False only the metadata is read ahead and the data are loaded
+            when first used. Default is True
+
+        constraints (optional): Only keep the cubes matching these iris
+            constraints (e.g. the names of the variables used in the loop),
+            so the other fields are not read. Default is all cubes
+
+    Yields:
+        iris.cube.CubeList: The cubes at each lead time in turn
+    """
+    forecast = forecast.copy()
+    if lead_times is None:
+        times = sorted(forecast_files(forecast))
+    else:
+        times = [forecast.start_time + lead_time for lead_time in lead_times]
+
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for space in the queue but give up if the loop has finished
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def load():
+        try:
+            for time in times:
+                with file_lock:
+                    cubes = forecast.set_time(time)
+                    if constraints is not None:
+                        cubes = cubes.extract(constraints)
+                    for cube in cubes:
+                        _load_coords(cube)
+                        if load_data:
+                            cube.data
+                if not put((cubes, None)):
+                    return
+        except Exception as error:
+            put((None, error))
+            return
+        put((None, None))
+
+    thread = threading.Thread(target=load)
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            cubes, error = queue.get()
+            if error is not None:
+                raise error
+            elif cubes is None:
+                return
+            yield cubes
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _load_coords(cube):
+    # Derived coordinates are calculated from these when used
+    for coord in cube.dim_coords + cube.aux_coords:
+        coord.points
+        coord.bounds
+
+
+def _nbytes(cubelist):
+    return sum(int(np.prod(cube.shape)) * cube.dtype.itemsize
+               for cube in cubelist)
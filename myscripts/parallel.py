@@ -0,0 +1,103 @@
+"""Run independent jobs across a pool of worker processes
+
+Each job is a (name, function, args, kwargs) tuple. A job that raises an error
+is reported as failed rather than stopping the remaining jobs.
+"""
+
+import multiprocessing
+import resource
+import traceback
+
+
+def imap(jobs, nproc=None, max_memory=None, maxtasksperchild=None):
+    """Run the jobs in a process pool and yield each result as it finishes
+
+    Args:
+        jobs (list): (name, function, args, kwargs) tuples. The function must
+            be defined at the top level of a module so it can be pickled
+
+        nproc (int, optional): Number of worker processes. Default is the
+            number of CPUs
+
+        max_memory (int, optional): Limit on the address space of each
+            worker process in bytes. A job exceeding the limit fails with a
+            MemoryError. Default is no limit
+
+        maxtasksperchild (int, optional): Number of jobs each worker process
+            runs before being replaced. Default is to keep workers alive
+
+    Yields:
+        name: The name of the finished job
+
+        result: The value returned by the job function or None if it failed
+
+        error (str): The traceback if the job failed or None if it succeeded
+    """
+    pool = multiprocessing.Pool(nproc, initializer=_limit_memory,
+                                initargs=(max_memory,),
+                                maxtasksperchild=maxtasksperchild)
+    try:
+        for output in pool.imap_unordered(_run_job, jobs):
+            yield output
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def run(jobs, nproc=None, max_memory=None, maxtasksperchild=None,
+        callback=None):
+    """Run the jobs in a process pool and report which jobs succeeded
+
+    Args:
+        jobs (list): (name, function, args, kwargs) tuples
+
+        nproc, max_memory, maxtasksperchild: See :func:`imap`
+
+        callback (optional): Function called in the main process with the
+            name and result of each job as it succeeds
+
+    Returns:
+        results (dict): Mapping of job name to the value returned by the job
+            for jobs that succeeded
+
+        failures (dict): Mapping of job name to the traceback for jobs that
+            failed
+    """
+    results, failures = {}, {}
+    for name, result, error in imap(jobs, nproc, max_memory, maxtasksperchild):
+        if error is None:
+            print('Finished {}'.format(name))
+            results[name] = result
+            if callback is not None:
+                callback(name, result)
+        else:
+            print('Failed {}'.format(name))
+            failures[name] = error
+
+    report(results, failures)
+
+    return results, failures
+
+
+def report(results, failures):
+    print('{} jobs succeeded, {} jobs failed'.format(
+        len(results), len(failures)))
+    for name in sorted(failures):
+        print('\n'.join(['', str(name), failures[name]]))
+
+    return
+
+
+def _run_job(job):
+    name, function, args, kwargs = job
+    try:
+        return name, function(*args, **kwargs), None
+    except Exception:
+        return name, None, traceback.format_exc()
+
+
+def _limit_memory(max_memory):
+    if max_memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+    return
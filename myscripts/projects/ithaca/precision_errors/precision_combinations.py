@@ -3,10 +3,8 @@ other precision.
 """
 import matplotlib.pyplot as plt
 import iris
-from iris.cube import CubeList
-from iris.coords import AuxCoord
 import iris.quickplot as qplt
-from myscripts.statistics import rms_diff
+from myscripts.statistics import rms_diff_matrix
 from myscripts.models.speedy import datadir
 
 
@@ -25,22 +23,8 @@ def main():
     cube = iris.load_cube(path + filename, cs)
 
     # Calculate the errors with each different precision used as the `truth`
-    diffs = CubeList()
-    for pseudo_truth in cube.slices_over('precision'):
-        # Add the precision of the `truth` cube as another coordinate
-        p = pseudo_truth.coord('precision').points[0]
-        p = AuxCoord(p, long_name='reference_precision')
-
-        # Calculate the errors
-        diff = rms_diff(cube, pseudo_truth)
-        diff.add_aux_coord(p)
-
-        # Store the errors in the cubelist
-        diffs.append(diff)
-
-    # Combine all the errors into a single cube with dimensions of
-    # precision vs reference_precision
-    diffs = diffs.merge_cube()
+    # as a single cube with dimensions of precision vs reference_precision
+    diffs = rms_diff_matrix(cube, 'precision')
 
     # Plot the errors
     qplt.pcolor(diffs, vmin=0, cmap='cubehelix_r')
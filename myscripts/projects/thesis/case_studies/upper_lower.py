@@ -1,12 +1,14 @@
 import matplotlib.pyplot as plt
 import iris.plot as iplt
 from irise import convert, plot
+from myscripts.files import cache
 from myscripts.models.um import case_studies
 
 
-def main(cubes):
-    pv = convert.calc('air_potential_temperature', cubes,
-                      levels=('ertel_potential_vorticity', [2]))[0]
+def main(forecast):
+    cubes = forecast.cubelist
+    pv = cache.calc(forecast, 'air_potential_temperature',
+                    levels=('ertel_potential_vorticity', [2]), case='iop8')[0]
 
     theta = convert.calc('air_potential_temperature', cubes,
                          levels=('air_pressure', [85000]))[0]
@@ -21,5 +23,5 @@ def main(cubes):
 
 if __name__ == '__main__':
     forecast = case_studies.iop8.copy()
-    cubes = forecast.set_lead_time(hours=24)
-    main(cubes)
+    forecast.set_lead_time(hours=24)
+    main(forecast)
@@ -13,6 +13,7 @@ import iris.plot as iplt
 from irise import convert, grid, plot
 from irise.constants import r
 from irise.diagnostics.rossby_waves import tropopause_contour
+from myscripts.files import cache
 from myscripts.models.um import case_studies
 
 r = r.data
@@ -26,7 +27,8 @@ def main():
     cubes = forecast.set_lead_time(hours=lead_time)
     dtheta = convert.calc('total_minus_advection_only_theta', cubes,
                           levels=levels)[0]
-    pv = convert.calc('ertel_potential_vorticity', cubes, levels=levels)[0]
+    pv = cache.calc(forecast, 'ertel_potential_vorticity', levels=levels,
+                    case='iop5_extended')[0]
 
     closed_loop, points = get_points(dtheta.copy(), pv.copy())
     closed_loop = increase_circuit_resolution(closed_loop, 25000)
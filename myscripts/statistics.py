@@ -1,22 +1,36 @@
 """Functions for calculating global statistics
 
 Shorthands for cube.collapsed on a lat/lon grid with various different
-aggregators.
+aggregators, and accumulators for statistics over many cubes that are too
+large to load at once. The global statistics take a chunk_size argument to
+work through lazily loaded cubes a block of forecast_reference_times at a
+time.
 """
 
+import hashlib
+from functools import partial
+import numpy as np
 from iris.analysis import MEAN, STD_DEV, COUNT
 from iris.analysis.cartography import cosine_latitude_weights
+from iris.coords import AuxCoord, CellMethod
+from iris.cube import Cube, CubeList
 
 
-def global_mean(cube):
-    weights = cosine_latitude_weights(cube)
+def global_mean(cube, chunk_size=None):
+    if chunk_size is not None:
+        return _blockwise(global_mean, chunk_size, cube)
+
+    weights = horizontal_weights(cube)
     mean = cube.collapsed(['longitude', 'latitude'], MEAN, weights=weights)
 
     return mean
 
 
-def root_mean_square(cube):
-    weights = cosine_latitude_weights(cube)**2
+def root_mean_square(cube, chunk_size=None):
+    if chunk_size is not None:
+        return _blockwise(root_mean_square, chunk_size, cube)
+
+    weights = horizontal_weights(cube, power=2)
     rms = (cube**2).collapsed(['longitude', 'latitude'],
                               MEAN, weights=weights)**0.5
 
@@ -30,22 +44,651 @@ def ensemble_std_dev(cube):
     return std
 
 
-def rms_diff(zfc, zref):
+def rms_diff(zfc, zref, chunk_size=None):
+    if chunk_size is not None:
+        return _blockwise(rms_diff, chunk_size, zfc, zref)
+
     rms = root_mean_square(zfc - zref)
     rms.rename('RMS error in {}'.format(zfc.name()))
 
     return rms
 
 
-def mean_diff(zfc, zref):
+def mean_diff(zfc, zref, chunk_size=None):
+    if chunk_size is not None:
+        return _blockwise(mean_diff, chunk_size, zfc, zref)
+
     mean = global_mean(zfc - zref)
     mean.rename('Mean error in {}'.format(zfc.name()))
 
     return mean
 
 
-def count(zfc, func=lambda x: x != 0):
+def count(zfc, func=lambda x: x != 0, chunk_size=None):
+    if chunk_size is not None:
+        return _blockwise(partial(count, func=func), chunk_size, zfc)
+
     nzfc = zfc.collapsed(['longitude', 'latitude'], COUNT, function=func)
     nzfc.rename('Number of {}'.format(zfc.name()))
 
     return nzfc
+
+
+def _blockwise(function, chunk_size, *cubes):
+    """Apply a statistic to blocks of forecast_reference_time in turn
+
+    Only one block of each (lazily loaded) cube is loaded at a time, so the
+    memory used depends on chunk_size rather than the number of forecasts.
+    Cubes without a forecast_reference_time dimension are passed whole to each
+    block.
+
+    Args:
+        function: Statistic taking the cubes and returning a cube with the
+            forecast_reference_time dimension kept
+        chunk_size (int): Number of forecast_reference_times in each block
+        *cubes (iris.cube.Cube): Arguments to function
+
+    Returns:
+        iris.cube.Cube: The results of each block joined along
+            forecast_reference_time
+    """
+    dim = 'forecast_reference_time'
+    sizes = [cube.shape[cube.coord_dims(dim)[0]]
+             for cube in cubes if cube.coords(dim, dim_coords=True)]
+    if not sizes:
+        return function(*cubes)
+
+    results = CubeList()
+    for start in range(0, sizes[0], chunk_size):
+        blocks = []
+        for cube in cubes:
+            if cube.coords(dim, dim_coords=True):
+                index = [slice(None)] * cube.ndim
+                index[cube.coord_dims(dim)[0]] = slice(start,
+                                                       start + chunk_size)
+                cube = cube[tuple(index)]
+            blocks.append(cube)
+
+        result = function(*blocks)
+        # Calculate now so the block can be released
+        result.data
+        results.append(result)
+
+    return results.concatenate_cube()
+
+
+def error_statistics(zfc, zref):
+    """Global bias, RMS, mean absolute, maximum and minimum error and the
+    number of differing points in a single pass over the data
+
+    The bias and mean absolute error are weighted as in :func:`global_mean`
+    and the RMS error as in :func:`root_mean_square`. The difference is
+    calculated one slice of the leading dimension at a time, so only one
+    slice of each (lazily loaded) cube is in memory at once and the weighted
+    sums are taken straight from the slice without full-size temporaries.
+    Masked points are left out of all the statistics.
+
+    Args:
+        zfc (iris.cube.Cube): Forecast
+        zref (iris.cube.Cube or float): Reference with the same lat/lon grid
+
+    Returns:
+        iris.cube.CubeList: Cubes in the same order as the statistics above
+            with the latitude and longitude dimensions collapsed
+    """
+    # Lazy difference so only the slices used are calculated
+    diff = zfc.copy(data=zfc.lazy_data())
+    if isinstance(zref, Cube):
+        zref = zref.copy(data=zref.lazy_data())
+    diff = diff - zref
+
+    axes = tuple(sorted(diff.coord_dims(name)[0]
+                        for name in ['latitude', 'longitude']))
+    index = tuple(slice(None) if n in axes else 0 for n in range(diff.ndim))
+    weights = horizontal_weights(diff)[index]
+    weights_squared = horizontal_weights(diff, power=2)[index]
+
+    if 0 in axes:
+        blocks = [slice(None)]
+    else:
+        blocks = [slice(n, n + 1) for n in range(diff.shape[0])]
+
+    sums = []
+    for block in blocks:
+        data = diff[block].data
+        mask = np.ma.getmaskarray(data)
+        values = np.ma.filled(data, 0)
+
+        # Sum of the weights of the unmasked points
+        if np.ma.is_masked(data):
+            total = np.tensordot(~mask, weights, (axes, (0, 1)))
+            total_squared = np.tensordot(~mask, weights_squared,
+                                         (axes, (0, 1)))
+        else:
+            total = weights.sum()
+            total_squared = weights_squared.sum()
+
+        # Slices with every point masked give NaN and are masked below
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sums.append([
+                np.tensordot(values, weights, (axes, (0, 1))) / total,
+                np.sqrt(np.tensordot(values ** 2, weights_squared,
+                                     (axes, (0, 1))) / total_squared),
+                np.tensordot(abs(values), weights, (axes, (0, 1))) / total,
+                np.ma.max(data, axis=axes),
+                np.ma.min(data, axis=axes),
+                np.logical_and(values != 0, ~mask).sum(axis=axes)])
+
+    names = ['Mean error in {}', 'RMS error in {}',
+             'Mean absolute error in {}', 'Maximum error in {}',
+             'Minimum error in {}', 'Number of {}']
+    template = _collapsed_template(diff)
+    cubes = CubeList()
+    for n, name in enumerate(names):
+        result = np.ma.concatenate([np.ma.atleast_1d(block[n])
+                                    for block in sums])
+        result = np.ma.masked_invalid(result).reshape(template.shape)
+        if not np.ma.is_masked(result):
+            result = result.data
+        cube = template.copy(data=result)
+        cube.rename(name.format(zfc.name()))
+        cubes.append(cube)
+    cubes[-1].units = '1'
+
+    return cubes
+
+
+def rms_diff_matrix(cube, dim='precision', chunk_size=None):
+    """RMS difference between every pair of slices of a cube along a dimension
+
+    Equivalent to calling :func:`rms_diff` with each slice as the reference
+    but calculated in one step from the weighted Gram matrix of the slices,
+    using :math:`\\sum w(x_i - x_j)^2 = \\sum w x_i^2 + \\sum w x_j^2 -
+    2 \\sum w x_i x_j`. The slices are centred on their mean first to reduce
+    rounding error. Each pair of slices is compared on the points where
+    neither is masked.
+
+    Args:
+        cube (iris.cube.Cube): Cube with latitude, longitude and dim
+            dimensions
+        dim (str): Name of the dimension to compare slices along. Default is
+            'precision'
+        chunk_size (int, optional): Number of lat/lon points to load at once.
+            Default is all points
+
+    Returns:
+        iris.cube.Cube: The RMS differences with dimensions (reference_<dim>,
+            <dim>, other dimensions of the cube), so element [j, i] is the
+            RMS difference of slice i from reference slice j. Masked where a
+            pair of slices have no unmasked points in common
+    """
+    dim_axis = cube.coord_dims(dim)[0]
+    lat_axis = cube.coord_dims('latitude')[0]
+    lon_axis = cube.coord_dims('longitude')[0]
+    others = [n for n in range(cube.ndim)
+              if n not in (dim_axis, lat_axis, lon_axis)]
+    order = [dim_axis] + others + [lat_axis, lon_axis]
+
+    # Arrange the data as (dim, other dimensions, lat/lon points)
+    x = cube.core_data().transpose(order)
+    nslices = x.shape[0]
+    x = x.reshape(nslices, int(np.prod(x.shape[1:-2])), -1)
+    weights = horizontal_weights(cube, power=2).transpose(order)
+    weights = weights[(0,) * (len(others) + 1)].ravel()
+
+    # Weighted sums over the points used for each pair of slices [i, j] of
+    # the Gram matrix, the squares of slice i and the weights
+    npoints = x.shape[-1]
+    if chunk_size is None:
+        chunk_size = npoints
+    shape = [nslices, nslices, x.shape[1]]
+    gram, squares, total = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for start in range(0, npoints, chunk_size):
+        block = x[..., start:start + chunk_size]
+        if hasattr(block, 'compute'):
+            block = block.compute()
+        block = np.ma.asanyarray(block, dtype=np.float64)
+        w = weights[start:start + chunk_size]
+
+        masked = np.ma.is_masked(block)
+        valid = (~np.ma.getmaskarray(block)).astype(np.float64)
+        block = np.ma.filled(block - np.ma.filled(block.mean(axis=0), 0), 0)
+        gram += np.einsum('imp,jmp->ijm', block * w, block)
+        if masked:
+            squares += np.einsum('imp,jmp->ijm', block ** 2 * w, valid)
+            total += np.einsum('imp,jmp->ijm', valid * w, valid)
+        else:
+            squares += np.einsum('imp,p->im', block ** 2, w)[:, np.newaxis]
+            total += w.sum()
+
+    msd = squares + squares.transpose(1, 0, 2) - 2 * gram
+    # Exactly zero rather than rounding error for each slice with itself
+    msd[np.arange(nslices), np.arange(nslices)] = 0
+    rms = np.sqrt(_divide(np.clip(msd, 0, None), total))
+    if np.any(total == 0):
+        rms = np.ma.masked_where(total == 0, rms)
+
+    # Put each column into a cube and merge along the reference dimension
+    template = _collapsed_template(cube)
+    remaining = [n for n in range(cube.ndim) if n not in (lat_axis, lon_axis)]
+    template.transpose([remaining.index(n) for n in [dim_axis] + others])
+    diffs = CubeList()
+    for j, reference in enumerate(cube.coord(dim).points):
+        diff = template.copy(data=rms[:, j].reshape(template.shape))
+        diff.rename('RMS error in {}'.format(cube.name()))
+        diff.add_aux_coord(AuxCoord(reference, long_name='reference_' + dim,
+                                    units=cube.coord(dim).units))
+        diffs.append(diff)
+    diffs = diffs.merge_cube()
+
+    # merge_cube puts the new dimension first, but make sure of the order
+    diffs.transpose([diffs.coord_dims('reference_' + dim)[0],
+                     diffs.coord_dims(dim)[0]] +
+                    [n for n in range(diffs.ndim)
+                     if n not in (diffs.coord_dims('reference_' + dim) +
+                                  diffs.coord_dims(dim))])
+
+    return diffs
+
+
+def _collapsed_template(cube):
+    """The cube with the latitude and longitude dimensions collapsed to
+    scalar coordinates
+    """
+    axes = [cube.coord_dims(name)[0] for name in ['latitude', 'longitude']]
+    template = cube[tuple(0 if n in axes else slice(None)
+                          for n in range(cube.ndim))]
+    for name in ['latitude', 'longitude']:
+        template.replace_coord(cube.coord(name).collapsed())
+
+    return template
+
+
+# Cosine latitude weights for each lat/lon grid
+_weights = {}
+
+
+def horizontal_weights(cube, power=1):
+    """Cosine latitude weights broadcast to the shape of the cube
+
+    The weights are only calculated once for each lat/lon grid and are
+    broadcast to the other dimensions of the cube without copying, so the
+    result is read only
+
+    Args:
+        cube (iris.cube.Cube): Cube with latitude and longitude dimensions
+        power (int): Raise the weights to this power. Default is 1
+
+    Returns:
+        numpy.ndarray:
+    """
+    lat = cube.coord('latitude')
+    lon = cube.coord('longitude')
+    key = (_grid_hash(lat), _grid_hash(lon), power)
+    if key not in _weights:
+        grid = next(cube.slices([lat, lon]))
+        _weights[key] = cosine_latitude_weights(grid) ** power
+    weights = _weights[key]
+
+    lat_dim = cube.coord_dims(lat)[0]
+    lon_dim = cube.coord_dims(lon)[0]
+    shape = [1] * cube.ndim
+    shape[lat_dim] = cube.shape[lat_dim]
+    shape[lon_dim] = cube.shape[lon_dim]
+    if lat_dim > lon_dim:
+        weights = weights.transpose()
+
+    return np.broadcast_to(weights.reshape(shape), cube.shape)
+
+
+def _grid_hash(coord):
+    md5 = hashlib.md5(np.ascontiguousarray(coord.points).tobytes())
+    if coord.has_bounds():
+        md5.update(np.ascontiguousarray(coord.bounds).tobytes())
+
+    return coord.name(), str(coord.units), md5.hexdigest()
+
+
+class Accumulator(object):
+    """Running statistics over a dimension, updated one cube at a time
+
+    Uses the parallel form of Welford's algorithm (Chan et al.) so cubes can
+    be added in blocks along the dimension and accumulators built separately
+    (e.g. in different processes) can be merged. Masked points are left out,
+    so the number of samples can be different at each point. Statistics are
+    masked where there are no samples.
+
+    Coordinates that change along the dimension (e.g. time when accumulating
+    over forecast_reference_time) are removed from the results.
+
+    Example:
+        >>> acc = Accumulator('forecast_reference_time')
+        >>> for cube in cubes:
+        ...     acc.update(cube)
+        >>> mean, std_dev = acc.mean(), acc.std_dev()
+
+    Args:
+        dim (str): Name of the coordinate the statistics are calculated over
+
+    Attributes:
+        n (numpy.ndarray): Number of samples at each point
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.template = None
+        self.n = 0
+        self._mean = None
+        self._m2 = None
+        self._sumsq = None
+        self._min = None
+        self._max = None
+
+    def update(self, cube):
+        """Add a cube to the statistics
+
+        Args:
+            cube (iris.cube.Cube): Either a single sample with dim as a scalar
+                coordinate or several samples along the dim dimension
+        """
+        dims = cube.coord_dims(self.dim)
+        if dims:
+            axis = dims[0]
+            data = np.moveaxis(
+                np.ma.asanyarray(cube.data, dtype=np.float64), axis, 0)
+        else:
+            axis = None
+            data = np.ma.asanyarray(cube.data, dtype=np.float64)[np.newaxis]
+
+        if self.template is None:
+            self._set_template(cube, axis)
+        else:
+            self._remove_varying(cube, axis)
+
+        mask = np.ma.getmaskarray(data)
+        values = data.filled(0)
+
+        other = Accumulator(self.dim)
+        other.n = (~mask).sum(axis=0)
+        other._mean = _divide(values.sum(axis=0), other.n)
+        other._m2 = (np.where(mask, 0, values - other._mean) ** 2).sum(axis=0)
+        other._sumsq = (values ** 2).sum(axis=0)
+        other._min = np.where(mask, np.inf, values).min(axis=0)
+        other._max = np.where(mask, -np.inf, values).max(axis=0)
+        self._combine(other)
+
+        return
+
+    def merge(self, other):
+        """Add the statistics of another accumulator to this one
+        """
+        if self.template is None:
+            self.template = other.template
+        elif other.template is not None:
+            self._remove_varying(other.template)
+        self._combine(other)
+
+        return
+
+    def count(self):
+        cube = self._make_cube(np.broadcast_to(self.n, self.template.shape),
+                               'count', mask=False)
+        cube.rename('Number of {}'.format(self.template.name()))
+        cube.units = '1'
+
+        return cube
+
+    def mean(self):
+        return self._make_cube(self._mean, 'mean')
+
+    def variance(self, ddof=1):
+        cube = self._make_cube(_divide(self._m2, self.n - ddof), 'variance',
+                               mask=self.n <= ddof)
+        cube.units = self.template.units ** 2
+
+        return cube
+
+    def std_dev(self, ddof=1):
+        return self._make_cube(np.sqrt(_divide(self._m2, self.n - ddof)),
+                               'standard_deviation', mask=self.n <= ddof)
+
+    def rms(self):
+        return self._make_cube(np.sqrt(_divide(self._sumsq, self.n)),
+                               'root_mean_square')
+
+    def min(self):
+        return self._make_cube(self._min, 'minimum')
+
+    def max(self):
+        return self._make_cube(self._max, 'maximum')
+
+    def _combine(self, other):
+        if other._mean is None:
+            return
+        elif self._mean is None:
+            self.n = other.n
+            self._mean = other._mean
+            self._m2 = other._m2
+            self._sumsq = other._sumsq
+            self._min = other._min
+            self._max = other._max
+            return
+
+        n = self.n + other.n
+        delta = other._mean - self._mean
+        fraction = _divide(other.n, n)
+        self._mean = self._mean + delta * fraction
+        self._m2 = self._m2 + other._m2 + delta ** 2 * self.n * fraction
+        self._sumsq = self._sumsq + other._sumsq
+        self._min = np.minimum(self._min, other._min)
+        self._max = np.maximum(self._max, other._max)
+        self.n = n
+
+        return
+
+    def _set_template(self, cube, axis=None):
+        # A single sample without the coordinates of the collapsed dimension
+        if axis is not None:
+            cube = next(cube.slices_over(axis))
+        self.template = cube.copy(data=np.zeros(cube.shape))
+        self._remove_varying(cube)
+
+        return
+
+    def _remove_varying(self, cube, axis=None):
+        # Remove coordinates of the template that span the dimension or that
+        # are different in the new cube
+        for coord in self.template.coords():
+            matches = cube.coords(coord.name())
+            if (coord.name() == self.dim or len(matches) != 1 or
+                    (axis is not None and axis in cube.coord_dims(coord)) or
+                    matches[0] != coord):
+                self.template.remove_coord(coord)
+
+        return
+
+    def _make_cube(self, data, method, mask=None):
+        # Mask the points without samples by default
+        if mask is None:
+            mask = self.n == 0
+        if np.any(mask):
+            data = np.ma.masked_where(
+                np.broadcast_to(mask, self.template.shape), data)
+        cube = self.template.copy(data=data)
+        cube.add_cell_method(CellMethod(method, coords=self.dim))
+
+        return cube
+
+
+def _divide(a, b):
+    # a / b with zeros where b is zero
+    a, b = np.broadcast_arrays(a, b)
+    return np.divide(a, b, out=np.zeros(a.shape), where=b != 0)
+
+
+def percentile_summary(x, q, axis=0):
+    """Several percentiles and the mean of an array from a single partition
+
+    Gives the same percentiles as numpy.percentile (linear interpolation)
+    but the data are only partitioned once for all the percentiles
+
+    Args:
+        x (numpy.ndarray):
+        q (list): Percentiles to calculate (0-100)
+        axis (int): Axis to calculate the percentiles along. Default is 0
+
+    Returns:
+        percentiles (numpy.ndarray): The percentiles along the first axis
+            followed by the other axes of x
+        mean (numpy.ndarray):
+    """
+    x = np.moveaxis(np.asanyarray(x), axis, 0)
+    n = x.shape[0]
+
+    position = np.asarray(q, dtype=float) / 100 * (n - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, n - 1)
+    fraction = (position - lower).reshape((-1,) + (1,) * (x.ndim - 1))
+
+    partitioned = np.partition(x, np.unique(np.concatenate([lower, upper])),
+                               axis=0)
+    percentiles = (partitioned[lower] * (1 - fraction) +
+                   partitioned[upper] * fraction)
+
+    return percentiles, partitioned.mean(axis=0)
+
+
+class QuantileSketch(object):
+    """Approximate quantiles of many columns of data too large to keep
+
+    A t-digest style summary of each column: the data are merged into
+    centroids (a mean and a weight) which are smaller near the tails, so the
+    extreme quantiles stay accurate. Every column is updated at once with
+    array operations.
+
+    Example:
+        >>> sketch = QuantileSketch(ntimes)
+        >>> for block in blocks:  # arrays of shape (nsamples, ntimes)
+        ...     sketch.update(block)
+        >>> percentiles, mean = sketch.percentile_summary([5, 50, 95])
+
+    Args:
+        ncolumns (int): Number of independent columns (e.g. times)
+        compression (int): Controls the number of centroids (about
+            compression / 2 for each column) and so the accuracy. Default is
+            100
+    """
+
+    def __init__(self, ncolumns, compression=100):
+        self.ncolumns = ncolumns
+        self.compression = compression
+        self.ncentroids = int(np.ceil(compression / 2)) + 1
+
+        self.means = np.zeros([ncolumns, self.ncentroids])
+        self.weights = np.zeros([ncolumns, self.ncentroids])
+        self.total = 0.0
+        self.sum = np.zeros(ncolumns)
+        self.min = np.full(ncolumns, np.inf)
+        self.max = np.full(ncolumns, -np.inf)
+
+    def update(self, x):
+        """Add samples to the sketch
+
+        Args:
+            x (numpy.ndarray): Array of shape (nsamples, ncolumns)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        self.total += x.shape[0]
+        self.sum += x.sum(axis=0)
+        self.min = np.minimum(self.min, x.min(axis=0))
+        self.max = np.maximum(self.max, x.max(axis=0))
+
+        # Each new sample is a centroid with a weight of one
+        self._compress(
+            np.concatenate([self.means, x.transpose()], axis=1),
+            np.concatenate([self.weights, np.ones(x.shape[::-1])], axis=1))
+
+        return
+
+    def merge(self, other):
+        """Add the samples summarised by another sketch to this one
+        """
+        self.total += other.total
+        self.sum += other.sum
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+        self._compress(np.concatenate([self.means, other.means], axis=1),
+                       np.concatenate([self.weights, other.weights], axis=1))
+
+        return
+
+    def percentile_summary(self, q):
+        """Approximate percentiles and the exact mean of each column
+
+        Args:
+            q (list): Percentiles to calculate (0-100)
+
+        Returns:
+            percentiles (numpy.ndarray): Shape (len(q), ncolumns)
+            mean (numpy.ndarray):
+        """
+        target = np.asarray(q, dtype=float) / 100 * self.total
+
+        # Interpolate between the centres of the centroids of each column,
+        # from the minimum at zero to the maximum at the total weight. Unused
+        # centroids are moved to the end
+        used = self.weights > 0
+        centres = self.weights.cumsum(axis=1) - self.weights / 2
+        x = np.concatenate([np.zeros([self.ncolumns, 1]),
+                            np.where(used, centres, np.inf),
+                            np.full([self.ncolumns, 1], self.total)], axis=1)
+        y = np.concatenate([self.min[:, np.newaxis], self.means,
+                            self.max[:, np.newaxis]], axis=1)
+        order = np.argsort(x, axis=1, kind='stable')
+        x = np.take_along_axis(x, order, axis=1)
+        y = np.take_along_axis(y, order, axis=1)
+
+        # The knots either side of each target, shape (ncolumns, len(q))
+        last = used.sum(axis=1)[:, np.newaxis]
+        lower = (x[:, np.newaxis, :] <= target[:, np.newaxis]).sum(axis=2) - 1
+        lower = np.clip(lower, 0, last)
+        upper = lower + 1
+        x0, x1 = (np.take_along_axis(x, index, axis=1)
+                  for index in (lower, upper))
+        y0, y1 = (np.take_along_axis(y, index, axis=1)
+                  for index in (lower, upper))
+        fraction = np.clip(_divide(target - x0, x1 - x0), 0, 1)
+        percentiles = (y0 + fraction * (y1 - y0)).transpose()
+
+        return percentiles, self.sum / self.total
+
+    def _compress(self, means, weights):
+        """Merge weighted points into the centroids of each column
+        """
+        order = np.argsort(means, axis=1)
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        # Neighbouring points go in the same centroid if they are in the same
+        # unit interval of the k1 scale function of the t-digest, which
+        # gives smaller centroids near the tails
+        cumulative = weights.cumsum(axis=1)
+        quantile = (cumulative - weights / 2) / cumulative[:, -1:]
+        k = (self.compression / (2 * np.pi) * np.arcsin(2 * quantile - 1) +
+             self.compression / 4)
+        centroid = np.clip(np.floor(k).astype(int), 0, self.ncentroids - 1)
+
+        # Sum the weights and weighted means of each centroid of each column
+        index = (centroid + self.ncentroids *
+                 np.arange(self.ncolumns)[:, np.newaxis]).ravel()
+        size = self.ncolumns * self.ncentroids
+        shape = (self.ncolumns, self.ncentroids)
+        self.weights = np.bincount(index, weights=weights.ravel(),
+                                   minlength=size).reshape(shape)
+        sums = np.bincount(index, weights=(weights * means).ravel(),
+                           minlength=size).reshape(shape)
+        self.means = np.divide(sums, self.weights, out=np.zeros(shape),
+                               where=self.weights > 0)
+
+        return
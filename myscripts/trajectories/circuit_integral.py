@@ -21,6 +21,7 @@ from myscripts import datadir, plotdir
 from irise.constants import omega
 from lagranto import trajectory
 from myscripts.models.um import case_studies
+from myscripts.models.um.forecast import prefetch
 
 a = 6378100
 
@@ -55,7 +56,10 @@ def calc_circulation(trajectories, forecast, theta_level, dtheta):
     levels = ('air_potential_temperature', [theta_level])
 
     results = iris.cube.CubeList()
-    for n, cubes in enumerate(forecast):
+    # Load the next lead time while calculating the current one
+    names = ['upward_air_velocity', 'air_potential_temperature',
+             'air_density', 'ertel_potential_vorticity']
+    for n, cubes in enumerate(prefetch(forecast, constraints=names)):
         print(n)
         if n == 0:
             # Load grid parameters
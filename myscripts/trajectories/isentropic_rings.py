@@ -10,6 +10,7 @@ from irise import convert, plot
 from irise.plot.util import add_map
 from myscripts import datadir, plotdir
 from myscripts.models.um import case_studies
+from myscripts.models.um.forecast import prefetch
 from myscripts.trajectories.cluster import select_cluster
 
 def main():
@@ -50,7 +51,8 @@ def main():
     print(len(trajectories))
 
     plt.figure()
-    for n, cubes in enumerate(forecast):
+    names = ['air_potential_temperature', 'ertel_potential_vorticity']
+    for n, cubes in enumerate(prefetch(forecast, constraints=names)):
         print(n)
         plt.clf()
         make_plot(cubes, rings, trajectories, theta_level, n+2)
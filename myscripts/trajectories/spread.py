@@ -1,8 +1,8 @@
 from datetime import timedelta
-import numpy as np
 import matplotlib.pyplot as plt
 from irise import plot
 from myscripts import datadir, plotdir
+from myscripts.statistics import percentile_summary
 from lagranto import trajectory
 from systematic_forecasts import second_analysis
 from myscripts.trajectories.cluster import select_cluster
@@ -56,12 +56,8 @@ def make_plot(trajectories, variable):
     # Calculate percentiles of selected variable
     c = second_analysis.all_diagnostics[variable]
     x = trajectories[variable]
-    xMed = np.median(x, axis=0)
-    xMean = x.mean(axis=0)
-    x95 = np.percentile(x, 95, axis=0)
-    x75 = np.percentile(x, 75, axis=0)
-    x25 = np.percentile(x, 25, axis=0)
-    x05 = np.percentile(x, 5, axis=0)
+    (x05, x25, xMed, x75, x95), xMean = percentile_summary(
+        x, [5, 25, 50, 75, 95], axis=0)
 
     # Make the plot
     plt.fill_between(times, x05, x95, color='lightgrey')
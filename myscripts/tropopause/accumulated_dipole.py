@@ -3,6 +3,7 @@ from irise import convert, grid, diagnostics
 
 from myscripts import datadir
 from myscripts.models.um import case_studies
+from myscripts.models.um.forecast import prefetch
 
 
 def main():
@@ -18,7 +19,8 @@ def main():
 
 def calc_dipole(forecast, names, bins, path):
     # Loop over all lead times in the forecast
-    for n, cubes in enumerate(forecast):
+    variables = ['advection_only_pv', 'air_density']
+    for n, cubes in enumerate(prefetch(forecast, constraints=variables)):
         print(n)
 
         # Load required variables
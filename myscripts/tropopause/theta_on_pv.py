@@ -1,17 +1,18 @@
 from datetime import timedelta as dt
 import matplotlib.pyplot as plt
-from irise import convert, plot
+from irise import plot
+from myscripts.files import cache
 from myscripts.models.um import case_studies
 
 
-def main(cubes, **kwargs):
-    theta = convert.calc('air_potential_temperature', cubes,
-                         levels=('ertel_potential_vorticity', [2]))
+def main(forecast, **kwargs):
+    theta = cache.calc(forecast, 'air_potential_temperature',
+                       levels=('ertel_potential_vorticity', [2]), case='iop5')
 
     plot.pcolormesh(theta[0], **kwargs)
     plt.show()
 
 if __name__ == '__main__':
-    forecast = case_studies.iop5()
-    cubes = forecast.set_lead_time(dt(hours=36))
-    main(cubes, vmin=285, vmax=350, cmap='plasma')
+    forecast = case_studies.iop5.copy()
+    forecast.set_lead_time(dt(hours=36))
+    main(forecast, vmin=285, vmax=350, cmap='plasma')
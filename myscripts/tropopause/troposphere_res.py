@@ -3,13 +3,21 @@ import numpy as np
 import iris
 from iris.analysis import MEAN, STD_DEV
 from irise import convert, grid, files
+from myscripts.files import stash_maps
 from myscripts.models.um import case_studies
+from myscripts.models.um.forecast import file_lock, prefetch
 
 
 def main(forecast, diagnostics, lead_times):
-    for n, lead_time in enumerate(lead_times):
+    # The PV tracers used to calculate the diagnostics and the variables used
+    # for the mask and mass
+    names = [stash.name for stash in stash_maps.pv_tracers.values()
+             if stash.name]
+    names += ['atmosphere_boundary_layer_thickness', 'specific_humidity',
+              'air_density']
+    for n, cubes in enumerate(prefetch(forecast, lead_times,
+                                       constraints=names)):
         print(n)
-        cubes = forecast.set_lead_time(lead_time)
 
         # Extract required variables
         x = convert.calc(diagnostics, cubes)
@@ -22,7 +30,8 @@ def main(forecast, diagnostics, lead_times):
         mask = make_mask(surf, pv, q)
         output = calculate(x, mass, mask)
 
-        files.save(output, str(n).zfill(3) + '.nc')
+        with file_lock:
+            files.save(output, str(n).zfill(3) + '.nc')
 
     return
 